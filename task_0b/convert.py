@@ -1,11 +1,40 @@
-import pandas as pd, pathlib
+import pandas as pd, pathlib, sys
 
-ROOT = pathlib.Path("data/participant_001")
+# the flatten manifest (hashing + freshness check) is shared with
+# task_1_ingestion; like pipeline.py importing this script, go by path
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "task_1_ingestion"))
+from manifest import Manifest, fingerprint
 
-for csv_path in ROOT.glob("*.csv"):
-    print("Converting", csv_path.name)
+ROOT     = pathlib.Path("data")
+MANIFEST = "_convert_manifest.json"     # csv → fingerprint + output, see manifest.py
+
+
+def convert_csv(csv_path):
     df = pd.read_csv(csv_path, parse_dates=[0])
     parquet_path = csv_path.with_suffix(".parquet")
     df.to_parquet(parquet_path, index=False)
-    print(" wrote", parquet_path.name)
-print("finished")
+    return parquet_path
+
+
+def main(root=ROOT, force=False):
+    manifest = Manifest(root / MANIFEST)
+
+    # every participant_* directory under root, not just participant_001
+    for pdir in sorted(root.glob("participant_*")):
+        for csv_path in sorted(pdir.glob("*.csv")):
+            key = str(csv_path.relative_to(root))
+            if not force and manifest.is_fresh(key, csv_path):
+                continue
+            fp = fingerprint(csv_path)
+            print("Converting", pdir.name, csv_path.name)
+            out = convert_csv(csv_path)
+            print(" wrote", out.name)
+            manifest.record(key, fp, out, rows=None)
+            manifest.save()
+    manifest.save()         # keeps mtimes refreshed by a hash match
+    print("finished")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    main(pathlib.Path(args[0]) if args else ROOT, force="--force" in sys.argv)
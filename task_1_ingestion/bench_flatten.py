@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark flatten.py row builders against the columnar ones on hr.json.
+
+Each implementation runs in its own subprocess so that peak RSS
+(ru_maxrss) belongs to that implementation alone.
+
+    python task_1_ingestion/bench_flatten.py [path/to/hr.json]
+"""
+
+import json, pathlib, resource, subprocess, sys, time
+
+import flatten
+
+DEFAULT_SRC = flatten.SRC_DIR / "hr.json"
+IMPLS = {
+    "rows":     lambda obj: flatten.FLATTEN["hr"](obj),
+    "columnar": lambda obj: flatten.columnar_frame(*flatten.COLUMNAR["hr"](obj)),
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_one(impl, path):
+    """Child process: time one implementation, print a JSON result line."""
+    with open(path) as f:
+        obj = json.load(f)
+    base = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    df = IMPLS[impl](obj)
+    secs = time.perf_counter() - t0
+
+    print(json.dumps({
+        "impl":      impl,
+        "rows":      len(df),
+        "secs":      secs,
+        "peak_mb":   peak_rss_mb(),
+        "delta_mb":  peak_rss_mb() - base,
+    }))
+
+
+def main():
+    path = pathlib.Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SRC
+    if not path.exists():
+        raise SystemExit(f"{path} not found (git lfs pull?)")
+
+    print(f"{'impl':<10}{'rows':>12}{'secs':>9}{'rows/sec':>14}"
+          f"{'peak MB':>10}{'Δ MB':>9}")
+    for impl in IMPLS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--run", impl, str(path)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['impl']:<10}{r['rows']:>12,}{r['secs']:>9.2f}"
+              f"{r['rows'] / r['secs']:>14,.0f}"
+              f"{r['peak_mb']:>10,.0f}{r['delta_mb']:>9,.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        run_one(sys.argv[2], sys.argv[3])
+    else:
+        main()
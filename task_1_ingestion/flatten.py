@@ -4,12 +4,29 @@ Flatten Wearipedia JSON → tidy CSV (timestamp,value) for all six metrics.
 Works with every synthetic-data shape (list-wrapped or dict-wrapped).
 """
 
-import json, pathlib, pandas as pd, re
+import argparse, json, pathlib, pandas as pd, re, shutil
 import itertools, re
+import numpy as np
+
+from manifest import MANIFEST_NAME, Manifest, fingerprint, item_key
+
+try:                                    # only needed for --stream
+    import ijson
+except ImportError:
+    ijson = None
+
+try:                                    # only needed for Arrow / Parquet output
+    import pyarrow as pa, pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 
 SRC_DIR = pathlib.Path("task_0b/data/participant_001")
 OUT_DIR = SRC_DIR
+PARQUET_ROOT   = pathlib.Path("task_0b/data/parquet")
+ROW_GROUP_ROWS = 3_600      # 1 h of 1 Hz HR – the granularity at which ingest.py
+                            # skips already-loaded rows by max(timestamp); it
+                            # still reads and COPYs INGEST_CHUNK_ROWS at a time
 JSONS   = {
     "hr"      : "hr.json",
     "activity": "activity.json",
@@ -20,14 +37,15 @@ JSONS   = {
 }
 
 # helpers
-def load(fn):
-    with open(SRC_DIR / fn) as f:
+def load(fn, src_dir=SRC_DIR):
+    with open(src_dir / fn) as f:
         return json.load(f)
 
-def write_csv(name, df):
-    out = OUT_DIR / f"{name}.csv"
+def write_csv(name, df, out_dir=OUT_DIR):
+    out = out_dir / f"{name}.csv"
     df.to_csv(out, index=False)
     print(f"wrote {out} rows={len(df):,}")
+    return out
 
 def find_dataset(node, key_re=r".*dataset$"):
     """
@@ -72,14 +90,12 @@ def iter_datasets(node, key_re=r".*dataset$"):
             yield from iter_datasets(v, key_re)
 
 #heart rate
-def flatten_hr(obj):
+def hr_days(obj):
     """
-    Synthetic hr.json:
+    Yield (date_str, dataset) for every day in a synthetic hr.json:
       top-level list  -> each item has heart_rate_day[0]
                          -> activities-heart-intraday.dataset[]
-    Returns 86 400 × 30 = 2 592 000 rows.
     """
-    rows = []
     day_containers = obj if isinstance(obj, list) else [obj]
 
     for d in day_containers:
@@ -96,7 +112,16 @@ def flatten_hr(obj):
             .get("activities-heart-intraday", {})
             .get("dataset", [])
         )
+        yield date_str, ds
 
+
+def flatten_hr(obj):
+    """
+    Returns 86 400 × 30 = 2 592 000 rows for the synthetic hr.json.
+    """
+    rows = []
+
+    for date_str, ds in hr_days(obj):
         for rec in ds:
             rows.append(
                 {
@@ -110,6 +135,13 @@ def flatten_hr(obj):
 
 
 #active zone minutes
+def azm_value(val_obj):
+    """AZM value can be int/float or nested dict – handle both."""
+    if isinstance(val_obj, (int, float)):
+        return float(val_obj)
+    return float(sum(val_obj.values()))     # dict → sum of all component AZM buckets
+
+
 def flatten_azm(obj):
     rows = []
     # top-level can be list or dict → normalise to list
@@ -124,13 +156,7 @@ def flatten_azm(obj):
                 ts = f"{date} {rec['minute']}"
                 val_obj = rec["value"]
 
-                # value can be int/float or nested dict – handle both
-                if isinstance(val_obj, (int, float)):
-                    val = float(val_obj)
-                else:                       # dict → sum of all component AZM buckets
-                    val = float(sum(val_obj.values()))
-
-                rows.append({"timestamp": ts, "value": val})
+                rows.append({"timestamp": ts, "value": azm_value(val_obj)})
 
     return pd.DataFrame(rows)
 
@@ -219,12 +245,398 @@ FLATTEN = {
 }
 
 
-# main
-for name, fn in JSONS.items():
-    path = SRC_DIR / fn
+# columnar
+# Same shapes as the flatten_* functions above, but every builder returns two
+# preallocated arrays – int64 epoch seconds and float64 values – instead of a
+# list of per-row dicts.  Timestamps are parsed in bulk by numpy rather than
+# glued together with f-strings.
+def _alloc(n):
+    return np.empty(n, dtype=np.int64), np.empty(n, dtype=np.float64)
+
+
+def _iso_seconds(strings):
+    """'YYYY-MM-DD[ T]HH:MM:SS[.fff]' (or a bare date) → epoch seconds."""
+    return (np.array(strings, dtype="U19")      # drops any .fff suffix
+              .astype("datetime64[s]")
+              .astype(np.int64))
+
+
+def _hms_seconds(strings):
+    """'HH:MM:SS' → seconds since midnight, parsed on the raw bytes."""
+    b = (np.array(strings, dtype="S8")
+           .view(np.uint8)
+           .reshape(-1, 8)
+           .astype(np.int64) - ord("0"))
+    return ((b[:, 0] * 10 + b[:, 1]) * 3600
+            + (b[:, 3] * 10 + b[:, 4]) * 60
+            + (b[:, 6] * 10 + b[:, 7]))
+
+
+def _fill_days(days, value_of):
+    """days = [(date_str, records, time_key)], time_key holds 'HH:MM:SS'."""
+    ts, vals = _alloc(sum(len(recs) for _, recs, _ in days))
+    i = 0
+    for date_str, recs, time_key in days:
+        n = len(recs)
+        ts[i:i + n] = (_iso_seconds([date_str])[0]
+                       + _hms_seconds([r[time_key] for r in recs]))
+        vals[i:i + n] = [value_of(r) for r in recs]
+        i += n
+    return ts, vals
+
+
+def _full(recs, ts_key, value_of):
+    """records that already carry a full ISO timestamp."""
+    ts, vals = _alloc(len(recs))
+    ts[:] = _iso_seconds([r[ts_key] for r in recs])
+    vals[:] = [value_of(r) for r in recs]
+    return ts, vals
+
+
+def columnar_hr(obj):
+    days = [(d, ds, "time") for d, ds in hr_days(obj)]
+    return _fill_days(days, lambda r: r["value"])
+
+
+def columnar_azm(obj):
+    containers = obj if isinstance(obj, list) else [obj]
+    days = [
+        (day.get("dateTime", ""), day.get("minutes", []), "minute")
+        for container in containers
+        for day in container.get("activities-active-zone-minutes-intraday", [])
+    ]
+    return _fill_days(days, lambda r: azm_value(r["value"]))
+
+
+def columnar_br(obj):
+    if isinstance(obj, list) and obj and "br" in obj[0]:
+        recs = [rec for day in obj for rec in day["br"]]
+        return _full(
+            recs, "dateTime",
+            lambda r: r["value"]["fullSleepSummary"]["breathingRate"],
+        )
+    df = flatten_br(obj)                        # rare legacy shapes
+    return (_iso_seconds(df["timestamp"].tolist()),
+            df["value"].to_numpy(np.float64))
+
+
+def columnar_hrv(obj, metric="rmssd"):
+    outer = obj if isinstance(obj, list) else [obj]
+    recs = [rec
+            for day in outer
+            for hrv_block in day.get("hrv", [])
+            for rec in hrv_block.get("minutes", [])]
+    return _full(recs, "minute", lambda r: r["value"][metric])
+
+
+def columnar_spo2(obj):
+    recs = [rec for day in obj for rec in day.get("minutes", [])]
+    return _full(recs, "minute", lambda r: r["value"])
+
+
+def columnar_activity(obj):
+    return _full(obj, "dateTime", lambda r: r["value"])
+
+
+COLUMNAR = {
+    "hr":       columnar_hr,
+    "activity": columnar_activity,
+    "azm":      columnar_azm,
+    "br":       columnar_br,
+    "hrv":      columnar_hrv,
+    "spo2":     columnar_spo2,
+}
+
+
+def columnar_frame(ts, vals):
+    """(epoch-second, value) arrays → DataFrame[timestamp, value]."""
+    return pd.DataFrame({"timestamp": ts.astype("datetime64[s]"), "value": vals})
+
+
+def columnar_table(ts, vals):
+    """(epoch-second, value) arrays → pyarrow Table, zero-copy where possible."""
+    if pa is None:
+        raise RuntimeError("columnar_table() needs pyarrow")
+    return pa.table({
+        "timestamp": pa.array(ts, type=pa.int64()).cast(pa.timestamp("s")),
+        "value":     pa.array(vals, type=pa.float64()),
+    })
+
+
+# streaming
+# Record-level parse for the big intraday arrays.  Each entry maps a metric to
+#   (record path relative to its day container,
+#    date key paths relative to the same container,
+#    rec -> (timestamp, value))
+# so only one record (plus, at worst, one day of records whose date key comes
+# after them) is ever held in memory.
+STREAMS = {
+    "hr": (
+        "activities-heart-intraday.dataset.item",
+        ("dateTime", "activities-heart.item.dateTime"),
+        lambda date, rec: (f"{date} {rec['time']}", float(rec["value"])),
+    ),
+    "azm": (
+        "minutes.item",
+        ("dateTime",),
+        lambda date, rec: (f"{date} {rec['minute']}", azm_value(rec["value"])),
+    ),
+    "hrv": (
+        "hrv.item.minutes.item",
+        (),
+        lambda date, rec: (rec["minute"], float(rec["value"]["rmssd"])),
+    ),
+    "spo2": (
+        "minutes.item",
+        (),
+        lambda date, rec: (rec["minute"], float(rec["value"])),
+    ),
+}
+
+
+def iter_records(f, rec_path, date_paths=()):
+    """
+    Event-based walk over an open JSON file.  Yields (date_str, record) for
+    every map found at a prefix ending in rec_path; date_str is the value of
+    the nearest date key inside the same day container (None if date_paths
+    is empty).
+    """
+    builder = rec_prefix = day_prefix = None
+    date, pending = None, []
+
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if builder is not None:                 # inside a record
+            builder.event(event, value)
+            if event == "end_map" and prefix == rec_prefix:
+                if date is None and date_paths:
+                    pending.append(builder.value)   # date key not seen yet
+                else:
+                    yield date, builder.value
+                builder = None
+            continue
+
+        if event == "start_map" and (prefix == rec_path
+                                     or prefix.endswith("." + rec_path)):
+            rec_prefix = prefix
+            day_prefix = prefix[: -len(rec_path)].rstrip(".")
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+
+        elif event == "string" and any(
+            prefix == p or prefix.endswith("." + p) for p in date_paths
+        ):
+            date = value
+            for rec in pending:
+                yield date, rec
+            pending = []
+
+        elif event == "end_map" and prefix == day_prefix:   # day finished
+            for rec in pending:
+                yield date, rec
+            date, pending = None, []
+
+
+def iter_chunks(name, path, chunk_rows):
+    """Stream one JSON file as ([timestamp_str], [value]) lists of ≤ chunk_rows."""
+    rec_path, date_paths, to_row = STREAMS[name]
+    ts, vals = [], []
+
+    with open(path, "rb") as f:
+        for date, rec in iter_records(f, rec_path, date_paths):
+            t, v = to_row(date, rec)
+            ts.append(t)
+            vals.append(v)
+            if len(ts) >= chunk_rows:
+                yield ts, vals
+                ts, vals = [], []
+    if ts:
+        yield ts, vals
+
+
+def stream_csv(name, path, chunk_rows, out_dir=OUT_DIR):
+    """Flatten one JSON file into out_dir/<name>.csv, chunk_rows at a time."""
+    out = out_dir / f"{name}.csv"
+    out.unlink(missing_ok=True)
+
+    total = 0
+    for ts, vals in iter_chunks(name, path, chunk_rows):
+        pd.DataFrame({"timestamp": ts, "value": vals}).to_csv(
+            out, mode="a", header=total == 0, index=False
+        )
+        total += len(ts)
+    if total == 0:
+        pd.DataFrame(columns=["timestamp", "value"]).to_csv(out, index=False)
+    print(f"wrote {out} rows={total:,} (streamed)")
+    return out, total
+
+
+# parquet
+# Output layout (hive-style, one directory per participant / metric / day):
+#   <root>/participant=1/metric=hr/date=2024-01-01/part-0.parquet
+# Columns: timestamp (UTC-naive, second precision; Parquet stores it as ms),
+# value double; zstd; ROW_GROUP_ROWS rows per row group.
+PARQUET_SCHEMA = None if pa is None else pa.schema([
+    ("timestamp", pa.timestamp("s")),
+    ("value",     pa.float64()),
+])
+
+
+def participant_id(pdir):
+    """participant_001 → 1"""
+    return int(re.search(r"(\d+)$", pathlib.Path(pdir).name).group(1))
+
+
+class ParquetSink:
+    """
+    Receives (epoch-second, value) arrays in time order and writes one file
+    per day, buffering so every row group except a day's last is exactly
+    ROW_GROUP_ROWS.  Out-of-order days get an extra part-N file.
+    """
+
+    def __init__(self, root, participant, metric):
+        self.dir = pathlib.Path(root) / f"participant={participant}" / f"metric={metric}"
+        shutil.rmtree(self.dir, ignore_errors=True)       # full rewrite
+        self.rows = 0
+        self._day = self._writer = None
+        self._ts, self._vals = [], []
+        self._parts = {}
+
+    def write(self, ts, vals):
+        days = ts // 86_400
+        cuts = np.flatnonzero(np.diff(days)) + 1
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(ts)]):
+            if days[lo] != self._day:
+                self._close_day()
+                self._open_day(days[lo])
+            self._ts.append(ts[lo:hi])
+            self._vals.append(vals[lo:hi])
+            self._flush(final=False)
+
+    def close(self):
+        self._close_day()
+        return self.rows
+
+    def _open_day(self, day):
+        date = np.datetime64(int(day), "D")
+        part = self._parts.get(day, 0)
+        self._parts[day] = part + 1
+        d = self.dir / f"date={date}"
+        d.mkdir(parents=True, exist_ok=True)
+        self._day = day
+        self._writer = pq.ParquetWriter(d / f"part-{part}.parquet",
+                                        PARQUET_SCHEMA, compression="zstd")
+
+    def _flush(self, final):
+        if not self._ts:
+            return
+        ts, vals = np.concatenate(self._ts), np.concatenate(self._vals)
+        n = len(ts) if final else len(ts) - len(ts) % ROW_GROUP_ROWS
+        if n:
+            table = pa.table(
+                [pa.array(ts[:n]).cast(pa.timestamp("s")), pa.array(vals[:n])],
+                schema=PARQUET_SCHEMA,
+            )
+            self._writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+            self.rows += n
+        self._ts, self._vals = ([ts[n:]], [vals[n:]]) if n < len(ts) else ([], [])
+
+    def _close_day(self):
+        if self._writer is not None:
+            self._flush(final=True)
+            self._writer.close()
+        self._day = self._writer = None
+
+
+def write_parquet(name, ts, vals, participant, root=PARQUET_ROOT):
+    """Columnar arrays → partitioned Parquet; returns (metric_dir, rows)."""
+    order = np.argsort(ts, kind="stable")
+    sink = ParquetSink(root, participant, name)
+    sink.write(ts[order], vals[order])
+    rows = sink.close()
+    print(f"wrote {sink.dir} rows={rows:,}")
+    return sink.dir, rows
+
+
+def stream_parquet(name, path, chunk_rows, participant, root=PARQUET_ROOT):
+    sink = ParquetSink(root, participant, name)
+    for ts, vals in iter_chunks(name, path, chunk_rows):
+        sink.write(_iso_seconds(ts), np.asarray(vals, dtype=np.float64))
+    rows = sink.close()
+    print(f"wrote {sink.dir} rows={rows:,} (streamed)")
+    return sink.dir, rows
+
+
+def flatten_one(name, src_dir=SRC_DIR, out_dir=None, stream=False,
+                columnar=False, chunk_rows=100_000, fmt="csv"):
+    """
+    Flatten <src_dir>/<JSONS[name]>.
+      fmt="csv"     → <out_dir>/<name>.csv   (out_dir defaults to src_dir)
+      fmt="parquet" → partitioned dataset under out_dir (default PARQUET_ROOT);
+                      always uses the columnar builders
+    Returns (output_path, rows), or (None, 0) if the JSON is missing.
+    """
+    path = src_dir / JSONS[name]
     if not path.exists():
-        print(f"WARNING: {fn} not found – skipped.")
-        continue
+        print(f"WARNING: {path} not found – skipped.")
+        return None, 0
+
+    if fmt == "parquet":
+        out_dir, pid = out_dir or PARQUET_ROOT, participant_id(src_dir)
+        if stream and name in STREAMS:
+            return stream_parquet(name, path, chunk_rows, pid, out_dir)
+        ts, vals = COLUMNAR[name](load(JSONS[name], src_dir))
+        return write_parquet(name, ts, vals, pid, out_dir)
 
-    tidy = FLATTEN[name](load(fn))
-    write_csv(name, tidy)
+    out_dir = out_dir or src_dir
+    if stream and name in STREAMS:
+        return stream_csv(name, path, chunk_rows, out_dir)
+
+    obj = load(JSONS[name], src_dir)
+    if columnar:
+        tidy = columnar_frame(*COLUMNAR[name](obj))
+    else:
+        tidy = FLATTEN[name](obj)
+    return write_csv(name, tidy, out_dir), len(tidy)
+
+
+# main
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--stream", action="store_true",
+                    help="incremental parse for the intraday metrics "
+                         "(needs ijson); bounded memory per file")
+    ap.add_argument("--chunk-rows", type=int, default=100_000,
+                    help="rows buffered before each CSV append in --stream mode")
+    ap.add_argument("--columnar", action="store_true",
+                    help="build typed numpy columns instead of per-row dicts")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                    help="parquet writes zstd files partitioned by "
+                         "participant/metric/day under --parquet-root")
+    ap.add_argument("--parquet-root", type=pathlib.Path, default=PARQUET_ROOT)
+    ap.add_argument("--force", action="store_true",
+                    help="rebuild even if the manifest says the JSON is unchanged")
+    args = ap.parse_args(argv)
+
+    if args.stream and ijson is None:
+        raise SystemExit("--stream needs the ijson package (pip install -r task_1_ingestion/requirements.txt)")
+    if args.format == "parquet" and pq is None:
+        raise SystemExit("--format parquet needs pyarrow")
+
+    out_dir = args.parquet_root if args.format == "parquet" else OUT_DIR
+    manifest = Manifest(SRC_DIR.parent / MANIFEST_NAME)
+    for name, fn in JSONS.items():
+        src, key = SRC_DIR / fn, item_key(SRC_DIR, name, args.format)
+        if src.exists() and not args.force and manifest.is_fresh(key, src):
+            print(f"{fn} unchanged – skipped.")
+            continue
+        fp = fingerprint(src) if src.exists() else None
+        out, rows = flatten_one(name, SRC_DIR, out_dir, stream=args.stream,
+                                columnar=args.columnar,
+                                chunk_rows=args.chunk_rows, fmt=args.format)
+        if out is not None:
+            manifest.record(key, fp, out, rows)
+            manifest.save()
+
+
+if __name__ == "__main__":
+    main()
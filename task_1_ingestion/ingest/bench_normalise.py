@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Throughput of ingest.normalise() for every CSV shape it accepts, against the
+row-by-row implementation it replaced (legacy() below).
+
+Builds one synthetic raw frame per shape (N_DAYS days of 1-minute data),
+checks both produce the same rows and reports rows/sec for each:
+
+    python task_1_ingestion/ingest/bench_normalise.py [n_days]
+"""
+
+from __future__ import annotations
+import json, sys, time
+
+import numpy as np
+import pandas as pd
+
+import ingest
+from ingest import _first_dataset, _safe_load
+
+N_DAYS = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+PER_DAY = 1440
+REPEAT = 3
+
+
+def legacy(raw: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """normalise() before vectorisation: iterrows + per-record to_datetime."""
+    if {"timestamp", "value"}.issubset(raw.columns):
+        tidy = raw[["timestamp", "value"]]
+    elif {"date", "time"}.issubset(raw.columns):
+        vcol = "steps" if {"steps"}.issubset(raw.columns) else "value"
+        tidy = pd.DataFrame({
+            "timestamp": pd.to_datetime(raw["date"] + " " + raw["time"]),
+            "value": raw[vcol].astype(float),
+        })
+    elif "dateTime" in raw.columns:
+        if "minutes" in raw.columns:
+            rows = []
+            for _, row in raw.iterrows():
+                for rec in _safe_load(row["minutes"]):
+                    rows.append({"timestamp": pd.to_datetime(rec["minute"]),
+                                 "value": float(rec["value"])})
+            tidy = pd.DataFrame(rows)
+        else:
+            vcol = "steps" if "steps" in raw.columns else "value"
+            tidy = pd.DataFrame({
+                "timestamp": pd.to_datetime(raw["dateTime"]),
+                "value": raw[vcol].astype(float),
+            })
+    elif raw.shape[1] == 1:
+        # only ever read the first row; the benchmark calls it once per row
+        blob = _safe_load(raw.iloc[0, 0])
+        date = (blob.get("dateTime") or blob.get("date")
+                or blob.get("activities-heart", [{}])[0].get("dateTime") or "")
+        rows = []
+        for rec in _first_dataset(blob):
+            t   = rec.get("time") or rec.get("minute") or "00:00:00"
+            val = rec.get("value") or rec.get("steps") or rec.get("minutes") or 0
+            rows.append({"timestamp": pd.to_datetime(f"{date} {t}"), "value": float(val)})
+        tidy = pd.DataFrame(rows)
+    else:
+        raise ValueError(f"{metric}.csv: unknown columns {list(raw.columns)}")
+
+    tidy["timestamp"] = pd.to_datetime(tidy["timestamp"], utc=True).dt.tz_convert(None)
+    tidy["value"] = tidy["value"].astype(float)
+    return tidy.sort_values("timestamp")
+
+
+def legacy_all_rows(raw: pd.DataFrame, metric: str) -> pd.DataFrame:
+    if raw.shape[1] == 1:
+        return pd.concat([legacy(raw.iloc[[i]], metric) for i in range(len(raw))])
+    return legacy(raw, metric)
+
+
+def best_of(fn, raw, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(raw.copy(), "bench")
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _day_recs(day: str, rng) -> list:
+    return [
+        {"minute": f"{day}T{m // 60:02d}:{m % 60:02d}:00",
+         "value": float(rng.integers(90, 101))}
+        for m in range(PER_DAY)
+    ]
+
+
+def shapes() -> dict:
+    rng = np.random.default_rng(0)
+    days = [str(d.date()) for d in pd.date_range("2024-01-01", periods=N_DAYS)]
+    ts = pd.date_range("2024-01-01", periods=N_DAYS * PER_DAY, freq="min")
+    vals = rng.integers(50, 120, len(ts)).astype(float)
+    recs = [_day_recs(d, rng) for d in days]
+    blobs = [
+        json.dumps({
+            "dateTime": d,
+            "activities-heart-intraday": {"dataset": [
+                {"time": r["minute"][11:], "value": r["value"]} for r in day_recs
+            ]},
+        })
+        for d, day_recs in zip(days, recs)
+    ]
+    return {
+        "timestamp,value":      pd.DataFrame({"timestamp": ts.astype(str), "value": vals}),
+        "date,time,value":      pd.DataFrame({"date": ts.strftime("%Y-%m-%d"),
+                                              "time": ts.strftime("%H:%M:%S"),
+                                              "value": vals}),
+        "dateTime,value":       pd.DataFrame({"dateTime": ts.astype(str), "value": vals}),
+        "dateTime,minutes json": pd.DataFrame({"dateTime": days,
+                                               "minutes": [json.dumps(r) for r in recs]}),
+        "dateTime,minutes repr": pd.DataFrame({"dateTime": days,
+                                               "minutes": [str(r) for r in recs]}),
+        "single JSON column":   pd.DataFrame({"payload": blobs}),
+    }
+
+
+def main() -> None:
+    print(f"{'shape':<24}{'rows':>10}{'before rows/s':>15}{'after rows/s':>15}{'speedup':>9}")
+    for name, raw in shapes().items():
+        t_old, old = best_of(legacy_all_rows, raw, repeat=1)    # minutes per run
+        t_new, new = best_of(ingest.normalise, raw)
+        assert (old["timestamp"].to_numpy() == new["timestamp"].to_numpy()).all()
+        assert np.allclose(old["value"].to_numpy(), new["value"].to_numpy())
+        n = len(new)
+        print(f"{name:<24}{n:>10,}{n / t_old:>15,.0f}{n / t_new:>15,.0f}"
+              f"{t_old / t_new:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,22 +10,72 @@ Supports 4 intraday shapes produced by Wearipedia:
 4.  single JSON column whose payload holds
     a .dataset list (rare – not used after flatten.py)
 
-On every run we load only rows with ts > last_ts stored in
-/checkpoint/last_run.json.
+It also reads the partitioned Parquet written by flatten.py --format parquet
+(<PARQUET_DIR>/participant=N/metric=M/date=D/part-K.parquet).
+
+Participants are discovered from the directory layout (see sources()) and
+loaded concurrently by a process pool capped at INGEST_DB_CONNECTIONS.
+
+Every (participant, metric) keeps its own watermark – the newest ts already
+loaded – in /checkpoint/participant_<id>.json, and every source file
+remembers how far it was read: a byte offset for CSVs (appended rows are read from there
+on), size/mtime plus row-group min/max statistics for Parquet (day
+partitions and row groups entirely at or before the watermark are never
+decoded).  A nightly run therefore only parses new data.
+
+Deltas are read in CHUNK_ROWS pieces and each piece is sent with a binary
+COPY over the worker's single connection (one transaction per
+participant/metric), so a first-time backfill runs in constant memory.
+
+INGEST_MODE=upsert COPYs into a session-local staging table instead and
+merges it with one INSERT … ON CONFLICT DO NOTHING/UPDATE, so overlapping
+deltas (re-runs after a partial failure, a lost checkpoint) cannot abort
+the load.
 """
 
 from __future__ import annotations
-import os, pathlib, json, ast, io, datetime as dt
-from typing import Any, Dict, List
+import os, pathlib, json, ast, io, csv, hashlib, re, struct, time, datetime as dt
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import psycopg2
+import pyarrow.parquet as pq
+
+from ingest_metrics import RunStats, write_textfile
 
 
 # config
 DATA_DIR       = pathlib.Path(os.getenv("DATA_DIR", "/data"))   # mounted CSVs
-CHECKPOINT_F   = pathlib.Path("/checkpoint/last_run.json")      # volume
-PARTICIPANT_ID = 1
+PARQUET_DIR    = pathlib.Path(os.getenv("PARQUET_DIR", DATA_DIR / "parquet"))
+CHECKPOINT_DIR = pathlib.Path(os.getenv("CHECKPOINT_DIR", "/checkpoint"))  # volume
+CHECKPOINT_F   = CHECKPOINT_DIR / "last_run.json"    # baseline {"last_ts"} checkpoint
+PARTICIPANT_ID = int(os.getenv("PARTICIPANT_ID", 1))  # for CSVs directly in DATA_DIR
+WORKERS        = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+DB_CONN_BUDGET = int(os.getenv("INGEST_DB_CONNECTIONS", 8))  # max open connections
+EPOCH          = dt.datetime(1970, 1, 1)
+TAIL_BYTES     = 4096       # bytes before a CSV offset hashed to detect rewrites
+CHUNK_ROWS     = int(os.getenv("INGEST_CHUNK_ROWS", 100_000))  # rows per COPY
+INGEST_MODE    = os.getenv("INGEST_MODE", "copy")        # copy | upsert
+ON_CONFLICT    = os.getenv("INGEST_ON_CONFLICT", "nothing")  # nothing | update
+METRICS_DIR    = pathlib.Path(os.getenv("INGEST_METRICS_DIR", "/metrics"))  # textfile collector
+
+# storage layout – only applied when raw_data is first created, see
+# ensure_schema(); compression / retention policies also apply to an
+# existing table
+RAW_LAYOUT           = os.getenv("RAW_LAYOUT", "plain")       # plain | compact
+RAW_SPACE_PARTITIONS = int(os.getenv("RAW_SPACE_PARTITIONS", 4))   # by participant
+RAW_CHUNK_INTERVAL   = os.getenv("RAW_CHUNK_INTERVAL", "1 day")    # = ingest cadence
+RAW_COMPRESS_AFTER   = os.getenv("RAW_COMPRESS_AFTER", "2 days")
+# retention is opt-in ("" = keep forever), e.g. RAW_RETENTION="90 days";
+# see enforce_retention()
+RAW_RETENTION        = os.getenv("RAW_RETENTION", "")         # then aggregates only
+AGG_1M_RETENTION     = os.getenv("AGG_1M_RETENTION", "")
+AGG_REFRESH_WINDOW   = "7 days"     # data_1m start_offset in aggregates.sql
+AGG_VIEWS            = ("data_1m", "adherence_1d", "data_1h", "data_1d")  # refresh order
+METRICS              = ("activity", "azm", "br", "hr", "hrv", "spo2")
 
 
 #postgres helpers
@@ -39,33 +89,280 @@ def pg_conn():
     )
 
 
-def ensure_schema() -> None:
-    with pg_conn() as c, c.cursor() as cur:
+RAW_PLAIN_SQL = """
+    CREATE TABLE IF NOT EXISTS raw_data (
+      ts           TIMESTAMPTZ NOT NULL,
+      participant  INT         NOT NULL,
+      metric       TEXT        NOT NULL,
+      value        DOUBLE PRECISION,
+      PRIMARY KEY (ts, participant, metric)
+    );
+    SELECT create_hypertable('raw_data','ts', if_not_exists => TRUE);
+"""
+
+# metric as a 4-byte enum instead of TEXT, hash-partitioned by participant,
+# chunks sized to one night's load
+RAW_COMPACT_SQL = """
+    DO $$ BEGIN
+      CREATE TYPE metric_t AS ENUM ({labels});
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$;
+    CREATE TABLE IF NOT EXISTS raw_data (
+      ts           TIMESTAMPTZ NOT NULL,
+      participant  INT         NOT NULL,
+      metric       metric_t    NOT NULL,
+      value        DOUBLE PRECISION,
+      PRIMARY KEY (ts, participant, metric)
+    );
+    SELECT create_hypertable('raw_data', 'ts',
+             partitioning_column => 'participant',
+             number_partitions   => %(parts)s,
+             chunk_time_interval => %(chunk)s::interval,
+             if_not_exists       => TRUE);
+"""
+
+
+def ensure_schema(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('raw_data') IS NOT NULL")
+        exists = cur.fetchone()[0]
+        if RAW_LAYOUT == "compact" and not exists:
+            labels = ", ".join(f"'{m}'" for m in METRICS)
+            cur.execute(RAW_COMPACT_SQL.format(labels=labels),
+                        {"parts": RAW_SPACE_PARTITIONS, "chunk": RAW_CHUNK_INTERVAL})
+        else:
+            cur.execute("SELECT to_regtype('metric_t') IS NULL")
+            if RAW_LAYOUT == "compact" and cur.fetchone()[0]:
+                print("raw_data already exists as a plain table – keeping its "
+                      "column types and partitioning")
+            cur.execute(RAW_PLAIN_SQL)
         cur.execute(
             """
-            CREATE TABLE IF NOT EXISTS raw_data (
-              ts           TIMESTAMPTZ NOT NULL,
+            -- bumped on every load so readers can tell when data changed
+            CREATE TABLE IF NOT EXISTS ingest_state (
               participant  INT         NOT NULL,
               metric       TEXT        NOT NULL,
-              value        DOUBLE PRECISION,
-              PRIMARY KEY (ts, participant, metric)
+              watermark    TIMESTAMPTZ,
+              updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+              PRIMARY KEY (participant, metric)
             );
-            SELECT create_hypertable('raw_data','ts', if_not_exists => TRUE);
             """
         )
+        apply_storage_policies(cur)
+    conn.commit()
+
+
+def apply_storage_policies(cur) -> None:
+    """
+    Columnar compression segmented by (participant, metric) and the chunk
+    interval.  Idempotent.  Retention is not a background policy – see
+    enforce_retention().
+    """
+    # raw chunks must outlive data_1m's refresh window, or a refresh over a
+    # dropped range would wipe the aggregates built from it
+    if RAW_RETENTION:
+        cur.execute("SELECT %s::interval > %s::interval",
+                    (RAW_RETENTION, AGG_REFRESH_WINDOW))
+        if not cur.fetchone()[0]:
+            raise SystemExit(f"RAW_RETENTION={RAW_RETENTION} must exceed the "
+                             f"{AGG_REFRESH_WINDOW} data_1m refresh window")
+    # the same holds for data_1m under data_1h / data_1d / adherence_1d, and
+    # it must not go before the raw rows it summarises (unset = kept forever)
+    if AGG_1M_RETENTION:
+        cur.execute("SELECT %s::interval > %s::interval, %s::interval >= %s::interval",
+                    (AGG_1M_RETENTION, AGG_REFRESH_WINDOW,
+                     AGG_1M_RETENTION, RAW_RETENTION or AGG_1M_RETENTION))
+        past_window, covers_raw = cur.fetchone()
+        if not (past_window and covers_raw and RAW_RETENTION):
+            raise SystemExit(f"AGG_1M_RETENTION={AGG_1M_RETENTION} must exceed the "
+                             f"{AGG_REFRESH_WINDOW} refresh window and be at least "
+                             f"RAW_RETENTION={RAW_RETENTION or '(unset, kept forever)'}")
+
+    cur.execute("SELECT set_chunk_time_interval('raw_data', %s::interval)",
+                (RAW_CHUNK_INTERVAL,))
+    cur.execute("""SELECT compression_enabled FROM timescaledb_information.hypertables
+                   WHERE hypertable_name = 'raw_data'""")
+    if not cur.fetchone()[0]:
+        cur.execute("""
+            ALTER TABLE raw_data SET (
+              timescaledb.compress,
+              timescaledb.compress_segmentby = 'participant, metric',
+              timescaledb.compress_orderby   = 'ts'
+            )""")
+    cur.execute("""SELECT add_compression_policy('raw_data',
+                     compress_after => %s::interval, if_not_exists => TRUE)""",
+                (RAW_COMPRESS_AFTER,))
+    # time-only drop jobs (if an earlier version added them) would delete
+    # backfilled history the aggregates never materialized
+    cur.execute("SELECT remove_retention_policy('raw_data', if_exists => TRUE)")
+    if _has_view(cur, "data_1m"):
+        cur.execute("SELECT remove_retention_policy('data_1m', if_exists => TRUE)")
+
+
+def _has_view(cur, view: str) -> bool:
+    cur.execute("""SELECT 1 FROM timescaledb_information.continuous_aggregates
+                   WHERE view_name = %s""", (view,))
+    return cur.fetchone() is not None
+
+
+def refresh_aggregates(oldest, newest) -> None:
+    """
+    Materialize what this run loaded, in hierarchy order.  The refresh
+    policies only look back AGG_REFRESH_WINDOW (adherence_1d 3 days), so
+    without this a backfill older than that would never reach data_1h,
+    data_1d or adherence_1d.  Incremental: only invalidated ranges inside
+    [oldest, newest] (widened to whole days) are recomputed.
+    """
+    conn = pg_conn()
+    conn.autocommit = True          # refresh_continuous_aggregate can't run in a txn
+    try:
+        with conn.cursor() as cur:
+            for view in AGG_VIEWS:
+                if not _has_view(cur, view):
+                    continue        # read API's aggregates.sql not applied yet
+                cur.execute("""CALL refresh_continuous_aggregate(%s,
+                                 time_bucket('1 day', %s::timestamptz),
+                                 time_bucket('1 day', %s::timestamptz) + INTERVAL '1 day')""",
+                            (view, oldest, newest))
+    finally:
+        conn.close()
+
+
+def enforce_retention() -> None:
+    """
+    Opt-in retention tiers: raw rows older than RAW_RETENTION, data_1m
+    older than AGG_1M_RETENTION; data_1h / data_1d are kept forever.
+
+    The refresh policies only look back AGG_REFRESH_WINDOW, so backfilled
+    history (e.g. the 2024 sample) would never be materialized and a plain
+    time-based drop would lose it.  Hence, after each load: refresh every
+    aggregate (hierarchy order) over everything older than that window –
+    incremental, only invalidated ranges are recomputed – and only then
+    drop the chunks past their tier.
+    """
+    if not (RAW_RETENTION or AGG_1M_RETENTION):
+        return
+    conn = pg_conn()
+    conn.autocommit = True          # refresh_continuous_aggregate can't run in a txn
+    try:
+        with conn.cursor() as cur:
+            views = [v for v in AGG_VIEWS if _has_view(cur, v)]
+            if "data_1m" not in views:
+                # read API's aggregates.sql not applied yet: nothing to fall back on
+                print("retention skipped: data_1m does not exist yet")
+                return
+            for view in views:
+                cur.execute("CALL refresh_continuous_aggregate(%s, NULL, now() - %s::interval)",
+                            (view, AGG_REFRESH_WINDOW))
+            tiers = [("raw_data", RAW_RETENTION)]
+            if "data_1h" in views:
+                tiers.append(("data_1m", AGG_1M_RETENTION))
+            for table, keep in tiers:
+                if keep:
+                    cur.execute("SELECT count(*) FROM drop_chunks(%s, older_than => %s::interval)",
+                                (table, keep))
+                    dropped = cur.fetchone()[0]
+                    if dropped:
+                        print(f"retention: dropped {dropped} {table} chunks older than {keep}")
+    finally:
+        conn.close()
+
+
+def ensure_metric_labels(conn, metrics) -> None:
+    """Compact layout: extend metric_t with metric names seen on disk."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regtype('metric_t') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        for m in sorted(set(metrics) - set(METRICS)):
+            cur.execute("ALTER TYPE metric_t ADD VALUE IF NOT EXISTS %s", (m,))
+    conn.commit()          # new labels are only usable once committed
+
+
+# binary COPY: 11-byte signature, int32 flags, int32 header-extension length;
+# per row int16 field count then (int32 length, bytes) per field; int16 -1.
+PG_COPY_HEADER  = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PG_COPY_TRAILER = struct.pack(">h", -1)
+PG_EPOCH_US     = 946_684_800_000_000     # 2000-01-01 in µs since 1970
+
+
+def encode_binary(df: pd.DataFrame) -> bytes:
+    """
+    [timestamp, participant, metric, value] → one binary COPY payload.
+    Rows are fixed-width per metric, so each metric group is packed as a
+    single numpy record array; NaN values are sent as NULL.
+    """
+    parts = [PG_COPY_HEADER]
+    for metric, g in df.groupby("metric", sort=False):
+        m = str(metric).encode()
+        ts = (g["timestamp"].to_numpy().astype("datetime64[us]").astype(np.int64)
+              - PG_EPOCH_US)
+        vals = g["value"].to_numpy(np.float64)
+        null = np.isnan(vals)
+        fields = [("n", ">i2"), ("l0", ">i4"), ("ts", ">i8"),
+                  ("l1", ">i4"), ("p", ">i4"), ("l2", ">i4"), ("m", f"S{len(m)}"),
+                  ("l3", ">i4")]
+        for mask, extra in ((~null, [("v", ">f8")]), (null, [])):
+            if not mask.any():
+                continue
+            rec = np.empty(int(mask.sum()), dtype=fields + extra)
+            rec["n"], rec["l0"], rec["l1"], rec["l2"] = 4, 8, 4, len(m)
+            rec["ts"] = ts[mask]
+            rec["p"] = g["participant"].to_numpy(np.int32)[mask]
+            rec["m"] = m
+            if extra:
+                rec["l3"], rec["v"] = 8, vals[mask]
+            else:
+                rec["l3"] = -1                  # NULL
+            parts.append(rec.tobytes())
+    parts.append(PG_COPY_TRAILER)
+    return b"".join(parts)
+
+
+def copy_df(cur, df: pd.DataFrame, table: str = "raw_data") -> None:
+    """Binary COPY of one chunk on the caller's transaction (PK + delta → no dupes)."""
+    cur.copy_expert(
+        f"COPY {table} (ts, participant, metric, value) FROM STDIN WITH (FORMAT binary)",
+        io.BytesIO(encode_binary(df)),
+    )
+
 
+# upsert mode
+# A TEMP table is never WAL-logged (same write cost as UNLOGGED) and is private
+# to this connection, so concurrent loaders never share or lock it.  It has no
+# PK, so COPY into it cannot fail on duplicates; ON COMMIT DELETE ROWS empties
+# it after every merge.
+STAGE_TABLE = "raw_data_stage"
+MERGE_SQL = {
+    "nothing": "DO NOTHING",
+    "update":  "DO UPDATE SET value = EXCLUDED.value",
+}
 
-def copy_df(df: pd.DataFrame) -> None:
-    """Bulk COPY into TimescaleDB (duplicates impossible due to PK + delta)."""
-    buf = io.StringIO()
-    df.to_csv(buf, index=False, header=False)
-    buf.seek(0)
-    with pg_conn() as c, c.cursor() as cur:
-        cur.copy_expert(
-            "COPY raw_data (ts, participant, metric, value) FROM STDIN WITH CSV",
-            buf,
+
+def ensure_stage(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE}
+              (LIKE raw_data INCLUDING DEFAULTS)
+              ON COMMIT DELETE ROWS
+            """
         )
-        c.commit()
+    conn.commit()
+
+
+def merge_stage(cur) -> int:
+    """Set-based merge of the staged rows; returns rows inserted/updated."""
+    cur.execute(
+        f"""
+        INSERT INTO raw_data (ts, participant, metric, value)
+        SELECT DISTINCT ON (ts, participant, metric) ts, participant, metric, value
+        FROM   {STAGE_TABLE}
+        ORDER  BY ts, participant, metric
+        ON CONFLICT (ts, participant, metric) {MERGE_SQL[ON_CONFLICT]}
+        """
+    )
+    return cur.rowcount
 
 
 #json helpeers
@@ -78,6 +375,43 @@ def _safe_load(cell: str | Any) -> Any:
         return ast.literal_eval(cell)
 
 
+_PY_LITERALS = re.compile(r"\b(True|False|None|nan|inf)\b")
+
+
+def _bulk_load(cells: pd.Series) -> List[Any]:
+    """
+    Decode a whole column of JSON (or Python-literal) cells with a single
+    parser call instead of one json.loads / literal_eval per cell.
+    """
+    if not all(isinstance(c, str) for c in cells):
+        return [_safe_load(c) for c in cells]
+    joined = "[" + ",".join(cells) + "]"
+    try:
+        return json.loads(joined)
+    except json.JSONDecodeError:
+        pass
+    # str(list_of_dicts) export: with no '"' and no bare literals, swapping
+    # quotes yields valid JSON (repr's \' escapes become \"), ~25× faster
+    # than literal_eval
+    if '"' not in joined and not _PY_LITERALS.search(joined):
+        try:
+            return json.loads(joined.replace("'", '"'))
+        except json.JSONDecodeError:
+            pass
+    return ast.literal_eval(joined)
+
+
+def _coalesce(df: pd.DataFrame, cols: List[str], default: Any) -> pd.Series:
+    """Vectorised `rec.get(a) or rec.get(b) or … or default`."""
+    out = pd.Series(default, index=df.index, dtype=object)
+    for col in reversed(cols):
+        if col in df.columns:
+            cur = df[col]
+            truthy = cur.notna() & cur.fillna(0).astype(bool)
+            out = cur.where(truthy, out)
+    return out
+
+
 def _first_dataset(node: Any) -> List[Dict]:
     """DFS until we find .dataset list; return []."""
     if isinstance(node, dict):
@@ -123,16 +457,16 @@ def normalise(raw: pd.DataFrame, metric: str) -> pd.DataFrame:
     #  combined dateTime
     elif "dateTime" in raw.columns:
         if "minutes" in raw.columns:            # SpO₂  (minutes is JSON list)
-            rows: List[Dict] = []
-            for _, row in raw.iterrows():
-                for rec in _safe_load(row["minutes"]):
-                    rows.append(
-                        {
-                            "timestamp": pd.to_datetime(rec["minute"]),
-                            "value": float(rec["value"]),
-                        }
-                    )
-            tidy = pd.DataFrame(rows)
+            recs = pd.DataFrame.from_records(
+                [rec for cell in _bulk_load(raw["minutes"]) for rec in cell],
+                columns=["minute", "value"],
+            )
+            tidy = pd.DataFrame(
+                {
+                    "timestamp": pd.to_datetime(recs["minute"]),
+                    "value": recs["value"].astype(float),
+                }
+            )
         else:                                   # activity daily total
             vcol = "steps" if "steps" in raw.columns else "value"
             tidy = pd.DataFrame(
@@ -144,19 +478,28 @@ def normalise(raw: pd.DataFrame, metric: str) -> pd.DataFrame:
 
     # single JSON payload column (pre-flatten archive – rarely hit)
     elif raw.shape[1] == 1:
-        blob = _safe_load(raw.iloc[0, 0])
-        date = (
-            blob.get("dateTime")
-            or blob.get("date")
-            or blob.get("activities-heart", [{}])[0].get("dateTime")
-            or ""
+        dates, frames = [], []
+        for blob in _bulk_load(raw.iloc[:, 0]):
+            ds = _first_dataset(blob)
+            dates.append(
+                blob.get("dateTime")
+                or blob.get("date")
+                or blob.get("activities-heart", [{}])[0].get("dateTime")
+                or ""
+            )
+            frames.append(pd.DataFrame.from_records(ds) if ds else pd.DataFrame())
+        recs = pd.concat(frames, ignore_index=True)
+        day = pd.Series(
+            [d for d, f in zip(dates, frames) for _ in range(len(f))], dtype=object
+        )
+        t   = _coalesce(recs, ["time", "minute"], "00:00:00")
+        val = _coalesce(recs, ["value", "steps", "minutes"], 0)
+        tidy = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(day + " " + t.astype(str)),
+                "value": val.astype(float),
+            }
         )
-        rows = []
-        for rec in _first_dataset(blob):
-            t   = rec.get("time") or rec.get("minute") or "00:00:00"
-            val = rec.get("value") or rec.get("steps") or rec.get("minutes") or 0
-            rows.append({"timestamp": pd.to_datetime(f"{date} {t}"), "value": float(val)})
-        tidy = pd.DataFrame(rows)
 
     else:
         raise ValueError(f"{metric}.csv: unknown columns {list(raw.columns)}")
@@ -168,43 +511,396 @@ def normalise(raw: pd.DataFrame, metric: str) -> pd.DataFrame:
 
 
 #checkpoint helpers
-def load_checkpoint() -> dt.datetime:
+# One file per participant (<CHECKPOINT_DIR>/participant_<id>.json), written
+# only by the worker loading that participant:
+#   {"watermarks": {"<participant>/<metric>": iso_ts},
+#    "files":      {"<path>": per-file read state}}
+def checkpoint_path(participant: int) -> pathlib.Path:
+    return CHECKPOINT_DIR / f"participant_{participant}.json"
+
+
+def load_checkpoint(participant: int) -> Dict[str, Any]:
+    """
+    Falls back to the old shared {"last_ts": ...} last_run.json, which
+    seeds every key with that ts.
+    """
+    path = checkpoint_path(participant)
+    if path.exists():
+        return json.load(open(path))
     if CHECKPOINT_F.exists():
-        ts = pd.to_datetime(json.load(open(CHECKPOINT_F))["last_ts"])
-        return ts.tz_localize(None)
-    return dt.datetime(1970, 1, 1)
+        old = json.load(open(CHECKPOINT_F))
+        if "last_ts" in old:
+            return {"watermarks": {}, "files": {}, "default": old["last_ts"]}
+    return {"watermarks": {}, "files": {}}
 
 
-def save_checkpoint(ts: dt.datetime) -> None:
-    CHECKPOINT_F.write_text(json.dumps({"last_ts": ts.isoformat()}))
+def save_checkpoint(participant: int, ckpt: Dict[str, Any]) -> None:
+    path = checkpoint_path(participant)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(ckpt, indent=1))
+    os.replace(tmp, path)                       # atomic on the same volume
 
 
-# main
-def main() -> None:
-    ensure_schema()
-    last_ts = load_checkpoint()
+def get_watermark(ckpt: Dict[str, Any], key: str) -> dt.datetime:
+    ts = ckpt["watermarks"].get(key) or ckpt.get("default")
+    if ts is None:
+        return EPOCH
+    return pd.Timestamp(ts).tz_localize(None).to_pydatetime()
+
+
+#sources
+def participant_id(name: str) -> int:
+    """participant_001 → 1, participant=7 → 7"""
+    return int(re.search(r"(\d+)$", name).group(1))
+
+
+def sources() -> Dict[int, List[Tuple[str, List[pathlib.Path]]]]:
+    """
+    participant → [(metric, files)] from three layouts:
+      DATA_DIR/<metric>.csv                        (PARTICIPANT_ID)
+      DATA_DIR/participant_<id>/<metric>.csv
+      PARQUET_DIR/participant=<id>/metric=<m>/date=<d>/*.parquet
+    """
+    out: Dict[int, List] = defaultdict(list)
+    for csv_path in sorted(DATA_DIR.glob("*.csv")):
+        out[PARTICIPANT_ID].append((csv_path.stem.lower(), [csv_path]))
+    for pdir in sorted(DATA_DIR.glob("participant_*")):
+        for csv_path in sorted(pdir.glob("*.csv")):
+            out[participant_id(pdir.name)].append((csv_path.stem.lower(), [csv_path]))
+    for mdir in sorted(PARQUET_DIR.glob("participant=*/metric=*")):
+        metric = mdir.name.split("=", 1)[1]
+        out[participant_id(mdir.parent.name)].append(
+            (metric, sorted(mdir.glob("date=*/*.parquet")))
+        )
+    return dict(out)
+
+
+def _tail_hash(path: pathlib.Path, offset: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.sha1(f.read(min(offset, TAIL_BYTES))).hexdigest()
+
+
+class _Window(io.RawIOBase):
+    """Read at most n bytes of f – lets pandas parse a byte range in chunks."""
+
+    def __init__(self, f, n: int):
+        self.f, self.left = f, n
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self.left <= 0:
+            return 0
+        n = self.f.readinto(memoryview(b)[: self.left])
+        self.left -= n
+        return n
+
 
-    for csv in DATA_DIR.glob("*.csv"):
-        metric = csv.stem.lower()
-        raw = pd.read_csv(csv)
+def _last_newline_end(f, size: int, floor: int) -> int:
+    """Offset just past the last newline in [floor, size); floor if none."""
+    pos = size
+    while pos > floor:
+        step = min(1 << 16, pos - floor)
+        f.seek(pos - step)
+        i = f.read(step).rfind(b"\n")
+        if i >= 0:
+            return pos - step + i + 1
+        pos -= step
+    return floor
 
+
+def read_csv_delta(
+    path: pathlib.Path, state: Optional[Dict], wm: dt.datetime
+) -> Tuple[Iterator[pd.DataFrame], Dict, int]:
+    """
+    Raw rows appended since the last run, as CHUNK_ROWS-sized frames, plus
+    the new file state and the number of bytes the frames cover.
+    Resumes at the stored byte offset if the header and the bytes just before
+    it are unchanged; otherwise the file was rewritten and is read from the
+    top (the ts watermark then drops rows that were already loaded).  A
+    trailing partial line is left for the next run.
+    """
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = len(header)
+        if (state and state.get("header") == header.decode()
+                and start <= state["offset"] <= size
+                and _tail_hash(path, state["offset"]) == state["tail"]):
+            start = state["offset"]
+        end = _last_newline_end(f, size, start)     # whole lines only
+
+    new_state = {"header": header.decode(), "offset": end,
+                 "tail": _tail_hash(path, end)}
+    cols = next(csv.reader([header.decode()]))
+
+    def chunks():
+        if end <= start:
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = io.BufferedReader(_Window(f, end - start))
+            yield from pd.read_csv(body, header=None, names=cols,
+                                   chunksize=CHUNK_ROWS)
+
+    return chunks(), new_state, max(0, end - start)
+
+
+def read_parquet_delta(
+    path: pathlib.Path, state: Optional[Dict], wm: dt.datetime
+) -> Tuple[Iterator[pd.DataFrame], Dict, int]:
+    """
+    Tidy rows newer than wm, CHUNK_ROWS at a time.  Unchanged files, day
+    partitions before the watermark day and row groups whose
+    max(timestamp) <= wm are skipped without decoding.
+    """
+    st = path.stat()
+    new_state = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if state == new_state:
+        return iter(()), new_state, 0
+
+    day = dt.date.fromisoformat(path.parent.name.split("=", 1)[1])
+    if day < wm.date():
+        return iter(()), new_state, 0
+
+    pf = pq.ParquetFile(path)
+    ts_col = pf.schema_arrow.get_field_index("timestamp")
+    groups = []
+    for i in range(pf.num_row_groups):
+        stats = pf.metadata.row_group(i).column(ts_col).statistics
+        if stats is None or not stats.has_min_max or \
+                pd.Timestamp(stats.max).tz_localize(None) > wm:
+            groups.append(i)
+    if not groups:
+        return iter(()), new_state, 0
+
+    md = pf.metadata
+    nbytes = sum(md.row_group(i).column(j).total_compressed_size
+                 for i in groups for j in range(md.num_columns))
+    batches = pf.iter_batches(batch_size=CHUNK_ROWS, row_groups=groups,
+                              columns=["timestamp", "value"])
+    return (b.to_pandas() for b in batches), new_state, nbytes
+
+
+def read_delta(path, state, wm):
+    reader = read_parquet_delta if path.suffix == ".parquet" else read_csv_delta
+    return reader(path, state, wm)
+
+
+BUMP_SQL = """
+    INSERT INTO ingest_state (participant, metric, watermark, updated_at)
+    VALUES (%s, %s, %s, now())
+    ON CONFLICT (participant, metric) DO UPDATE
+       SET watermark  = GREATEST(ingest_state.watermark, EXCLUDED.watermark),
+           updated_at = now()
+"""
+
+
+def load_metric(conn, ckpt: Dict[str, Any], participant: int, metric: str,
+                files: List[pathlib.Path]) -> int:
+    """
+    Stream every file's delta through normalise → COPY on one transaction,
+    then commit and advance the checkpoint.  Returns rows loaded; stage
+    timings, bytes, errors and lag go to the worker's STATS.
+    In upsert mode chunks go to the staging table and are merged just
+    before the commit.
+    """
+    target = STAGE_TABLE if INGEST_MODE == "upsert" else "raw_data"
+    key = f"{participant}/{metric}"
+    wm = get_watermark(ckpt, key)
+    rows, oldest, newest, states = 0, None, None, {}
+    t0 = time.perf_counter()
+
+    with conn.cursor() as cur:
+        for path in files:
+            chunks, state, nbytes = read_delta(path, ckpt["files"].get(str(path)), wm)
+            STATS.inc("ingestion_bytes_read_total", nbytes, metric=metric)
+            cur.execute("SAVEPOINT file_delta")
+            n, bottom, top = 0, None, None
+            try:
+                for raw in STATS.timed_iter(chunks, "parse", metric=metric):
+                    if raw.empty:
+                        continue
+                    with STATS.time("normalise", metric=metric):
+                        tidy = normalise(raw, metric)
+                        tidy = tidy[tidy["timestamp"] > wm]
+                    if tidy.empty:
+                        continue
+                    tidy.insert(1, "participant", participant)
+                    tidy.insert(2, "metric", metric)
+                    with STATS.time("copy", metric=metric):
+                        copy_df(cur, tidy, target)
+                    n += len(tidy)
+                    chunk_bottom, chunk_top = tidy["timestamp"].min(), tidy["timestamp"].max()
+                    bottom = chunk_bottom if bottom is None else min(bottom, chunk_bottom)
+                    top = chunk_top if top is None else max(top, chunk_top)
+            except ValueError as e:
+                print("WARNING:", e)
+                STATS.inc("ingestion_errors_total", metric=metric)
+                cur.execute("ROLLBACK TO SAVEPOINT file_delta")
+                continue                        # retry this file next run
+            rows += n
+            if top is not None:
+                oldest = bottom if oldest is None else min(oldest, bottom)
+                newest = top if newest is None else max(newest, top)
+            states[str(path)] = state
+        if INGEST_MODE == "upsert" and rows:
+            with STATS.time("merge", metric=metric):
+                staged, rows = rows, merge_stage(cur)
+            if staged != rows:
+                print(f"{key}: {staged - rows:,} staged rows already present")
+        if rows:
+            # same transaction as the data, so the read API's cache never
+            # sees new rows without the bump (or vice versa)
+            cur.execute(BUMP_SQL, (participant, metric, newest))
+    with STATS.time("commit", metric=metric):
+        conn.commit()
+    STATS.inc("ingestion_rows_total", rows, metric=metric)
+    if rows:
+        _widen(LOADED, oldest.to_pydatetime(), newest.to_pydatetime())
+
+    # only after the COPY committed: advance file offsets + watermark
+    if newest is not None:
+        ckpt["watermarks"][key] = newest.isoformat()
+    ckpt["files"].update(states)
+    save_checkpoint(participant, ckpt)
+
+    loaded_to = get_watermark(ckpt, key)
+    if loaded_to > EPOCH:
+        STATS.set_max("ingestion_lag_seconds",
+                      (dt.datetime.utcnow() - loaded_to).total_seconds(),
+                      metric=metric)
+
+    if rows:
+        secs = time.perf_counter() - t0
+        print(f"Ingested {rows:,} rows → {key} in {secs:.1f}s "
+              f"({rows / secs:,.0f} rows/s)")
+    return rows
+
+
+#workers
+# Each worker process holds one connection for its lifetime, so the pool
+# size is the DB-connection budget.
+_conn = None
+STATS = RunStats()          # per participant task, shipped back to the parent
+LOADED: List = [None, None]     # [oldest, newest] ts committed by the task
+
+
+def _widen(span: List, lo, hi) -> None:
+    if lo is None:
+        return
+    span[0] = lo if span[0] is None else min(span[0], lo)
+    span[1] = hi if span[1] is None else max(span[1], hi)
+
+
+def _init_worker() -> None:
+    global _conn
+    _conn = pg_conn()
+    if INGEST_MODE == "upsert":
+        ensure_stage(_conn)
+
+
+def ingest_participant(participant: int,
+                       metrics: List[Tuple[str, List[pathlib.Path]]]):
+    """
+    Returns (rows, LOADED, STATS snapshot) – the parent merges the
+    snapshots and refreshes the aggregates over the loaded range.
+    """
+    global STATS, LOADED
+    STATS, LOADED = RunStats(), [None, None]
+    ckpt = load_checkpoint(participant)
+    try:
+        rows = sum(
+            load_metric(_conn, ckpt, participant, metric, files)
+            for metric, files in metrics
+        )
+    except Exception as e:
+        # the savepoint only covers schema errors; anything else (duplicate
+        # key on plain COPY, bad cell, lost connection) leaves the
+        # transaction aborted – clean up so this worker's next participant
+        # starts on a usable connection
+        _reset_conn()
+        e.loaded = LOADED           # metrics committed before the failure
+        raise
+    return rows, LOADED, STATS.snapshot()
+
+
+def _reset_conn() -> None:
+    """Roll back the worker's connection, or reopen it if that fails."""
+    global _conn
+    if not _conn.closed:
         try:
-            tidy = normalise(raw, metric)
-        except ValueError as e:
-            print("WARNING:", e)
-            continue
-
-        new_rows = tidy[tidy["timestamp"] > last_ts]
-        if new_rows.empty:
-            continue
-
-        new_rows.insert(1, "participant", PARTICIPANT_ID)
-        new_rows.insert(2, "metric", metric)
-        copy_df(new_rows)
-        print(f"Ingested {len(new_rows):,} rows → {metric}")
-
-    save_checkpoint(dt.datetime.utcnow())
-    print("ingestion complete")
+            _conn.rollback()
+            return
+        except psycopg2.Error:
+            pass
+    try:
+        _conn.close()
+    except psycopg2.Error:
+        pass
+    _init_worker()
+
+
+# main
+def main() -> None:
+    stats = RunStats()
+    # every error series exists from run 1, see RunStats.declare
+    stats.declare("ingestion_errors_total", "metric", ("all", *METRICS))
+    t0, total, failed = time.perf_counter(), 0, []
+    loaded: List = [None, None]
+    todo: Dict = {}
+    try:
+        todo = sources()
+        stats.declare("ingestion_errors_total", "metric",
+                      {m for ms in todo.values() for m, _ in ms})
+        conn = pg_conn()
+        try:
+            ensure_schema(conn)
+            ensure_metric_labels(conn, {m for ms in todo.values() for m, _ in ms})
+        finally:
+            conn.close()
+
+        workers = max(1, min(WORKERS, DB_CONN_BUDGET, len(todo)))
+        print(f"{len(todo)} participants, {workers} workers")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(ingest_participant, participant, metrics): participant
+                for participant, metrics in sorted(todo.items())
+            }
+            for fut in as_completed(futures):
+                participant = futures[fut]
+                try:
+                    rows, span, snap = fut.result()
+                except Exception as e:              # others keep loading
+                    _widen(loaded, *getattr(e, "loaded", (None, None)))
+                    failed.append(participant)
+                    stats.inc("ingestion_errors_total", metric="all")
+                    print(f"ERROR participant {participant}: {e!r}")
+                    continue
+                total += rows
+                stats.merge(snap)
+                _widen(loaded, *span)
+        if loaded[0] is not None:
+            refresh_aggregates(*loaded)
+        enforce_retention()
+    except Exception:
+        stats.inc("ingestion_errors_total", metric="all")    # e.g. DB down
+        raise
+    finally:
+        secs = time.perf_counter() - t0
+        stats.set_max("ingestion_last_run_timestamp_seconds", time.time())
+        stats.set_max("ingestion_last_run_duration_seconds", secs)
+        stats.set_max("ingestion_last_run_failed_participants", len(failed))
+        write_textfile(stats, METRICS_DIR, CHECKPOINT_DIR / "metrics_state.json")
+
+    print(f"ingestion complete: {total:,} rows, {len(todo) - len(failed)} ok, "
+          f"{len(failed)} failed in {secs:.1f}s "
+          f"({total / secs if secs else 0:,.0f} rows/s)")
+    if failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""
+Prometheus metrics for ingest.py, written in the text exposition format for
+node-exporter's textfile collector – the loader is a cron job, so there is
+no process around for Prometheus to scrape.
+
+Workers accumulate into a RunStats and hand a snapshot back to the parent,
+which merges them and calls write_textfile() once per run.  Counter totals
+are kept in a small JSON next to the checkpoints so *_total series keep
+growing across runs (as Prometheus expects) even if the .prom file is
+removed.
+"""
+
+from __future__ import annotations
+import json, os, pathlib, time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+HELP = {
+    "ingestion_rows_total":         ("counter", "Rows loaded into raw_data"),
+    "ingestion_bytes_read_total":   ("counter", "Source bytes read (CSV delta, Parquet row groups)"),
+    "ingestion_stage_seconds_total": ("counter", "Wall time per pipeline stage"),
+    "ingestion_errors_total":       ("counter", "Files or participants that failed to load"),
+    "ingestion_lag_seconds":        ("gauge",   "Oldest watermark behind now, over participants"),
+    "ingestion_last_run_timestamp_seconds": ("gauge", "End of the last ingest run"),
+    "ingestion_last_run_duration_seconds":  ("gauge", "Duration of the last ingest run"),
+    "ingestion_last_run_failed_participants": ("gauge", "Participants that failed in the last run"),
+}
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]     # (name, sorted labels)
+
+
+def _key(name: str, labels: Dict[str, str]) -> Key:
+    return name, tuple(sorted(labels.items()))
+
+
+class RunStats:
+    """Counters add, gauges keep the max (only lag is set by workers)."""
+
+    def __init__(self):
+        self.counters: Dict[Key, float] = defaultdict(float)
+        self.gauges:   Dict[Key, float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        self.counters[_key(name, labels)] += value
+
+    def declare(self, name: str, label: str, values) -> None:
+        """
+        Create name{label=v} at 0 for each v.  A counter series that first
+        appears at 1 has no earlier sample, so increase() / rate() miss it.
+        """
+        for v in values:
+            self.counters[_key(name, {label: v})] += 0
+
+    def set_max(self, name: str, value: float, **labels) -> None:
+        k = _key(name, labels)
+        self.gauges[k] = max(value, self.gauges.get(k, value))
+
+    @contextmanager
+    def time(self, stage: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc("ingestion_stage_seconds_total",
+                     time.perf_counter() - t0, stage=stage, **labels)
+
+    def timed_iter(self, it: Iterator, stage: str, **labels) -> Iterator:
+        """Charge the time spent producing each item of it to stage."""
+        it = iter(it)
+        while True:
+            with self.time(stage, **labels):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    # process-pool transport: plain lists pickle and merge simply
+    def snapshot(self):
+        return list(self.counters.items()), list(self.gauges.items())
+
+    def merge(self, snap) -> None:
+        counters, gauges = snap
+        for k, v in counters:
+            self.counters[k] += v
+        for k, v in gauges:
+            self.gauges[k] = max(v, self.gauges.get(k, v))
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in labels) + "}"
+
+
+def write_textfile(stats: RunStats, out_dir: pathlib.Path,
+                   state_path: pathlib.Path, name: str = "ingest.prom") -> None:
+    """Add this run's counters to the persisted totals and write <out_dir>/<name>."""
+    totals: Dict[Key, float] = defaultdict(float)
+    if state_path.exists():
+        for n, labels, v in json.loads(state_path.read_text()):
+            totals[(n, tuple(map(tuple, labels)))] = v
+    for k, v in stats.counters.items():
+        totals[k] += v
+
+    tmp = state_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps([[n, labels, v] for (n, labels), v in totals.items()]))
+    os.replace(tmp, state_path)
+
+    if not out_dir.is_dir():
+        print(f"metrics dir {out_dir} missing – not writing {name}")
+        return
+    series = defaultdict(list)
+    for (n, labels), v in list(totals.items()) + list(stats.gauges.items()):
+        series[n].append(f"{n}{_labels(labels)} {float(v)!r}")
+    lines = []
+    for n in sorted(series):
+        kind, text = HELP.get(n, ("untyped", n))
+        lines += [f"# HELP {n} {text}", f"# TYPE {n} {kind}", *sorted(series[n])]
+
+    # write-then-rename so node-exporter never reads a half-written file
+    out = out_dir / name
+    tmp = out.with_name(f".{name}.tmp")
+    tmp.write_text("\n".join(lines) + "\n")
+    os.replace(tmp, out)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Bytes per row of raw_data, overall and before/after compression.
+
+    docker compose run --rm ingestor python /app/storage_report.py
+
+Run it before and after switching to RAW_LAYOUT=compact (or after the
+compression policy has caught up) to compare.
+"""
+
+from ingest import pg_conn
+
+SQL = """
+    SELECT approximate_row_count('raw_data'),
+           hypertable_size('raw_data'),
+           COALESCE(s.before_compression_total_bytes, 0),
+           COALESCE(s.after_compression_total_bytes, 0),
+           COALESCE(s.number_compressed_chunks, 0),
+           s.total_chunks
+    FROM   hypertable_compression_stats('raw_data') s
+"""
+
+
+def mb(n):
+    return f"{n / 2**20:,.1f} MB"
+
+
+def main() -> None:
+    conn = pg_conn()
+    with conn.cursor() as cur:
+        cur.execute(SQL)
+        rows, total, before, after, compressed, chunks = cur.fetchone()
+        cur.execute("""SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                       WHERE attrelid = 'raw_data'::regclass AND attname = 'metric'""")
+        metric_type = cur.fetchone()[0]
+    conn.close()
+
+    # what the table would take with every chunk uncompressed
+    uncompressed = total - after + before
+    print(f"rows (approx.)       {rows:,}")
+    print(f"metric column        {metric_type}")
+    print(f"chunks               {compressed or 0} of {chunks or 0} compressed")
+    print(f"size now             {mb(total)}")
+    print(f"size uncompressed    {mb(uncompressed)}")
+    if before:
+        print(f"compressed chunks    {mb(before)} → {mb(after)} "
+              f"({before / after:.1f}x)")
+    if rows:
+        print(f"bytes/row now        {total / rows:.1f}")
+        print(f"bytes/row before     {uncompressed / rows:.1f}")
+
+
+if __name__ == "__main__":
+    main()
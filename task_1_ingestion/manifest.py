@@ -0,0 +1,66 @@
+"""
+On-disk manifest of flatten inputs → outputs, so reruns skip unchanged files.
+
+One JSON file (<data root>/_manifest.json) maps a key such as
+"participant_001/hr/parquet" to
+
+    {"src": ..., "size": ..., "mtime_ns": ..., "sha256": ...,
+     "output": ..., "rows": ...}
+
+An input is fresh when its size and mtime match the entry and the recorded
+output still exists.  If only the mtime moved (touch, re-download, git
+checkout) the content hash decides, so identical bytes are not reprocessed.
+"""
+
+import hashlib, json, os, pathlib
+
+MANIFEST_NAME = "_manifest.json"
+
+
+def item_key(pdir, metric, fmt):
+    return f"{pathlib.Path(pdir).name}/{metric}/{fmt}"
+
+
+def sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(src):
+    """Taken *before* reading src, so a concurrent rewrite is caught next run."""
+    st = os.stat(src)
+    return {"src": str(src), "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns, "sha256": sha256(src)}
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.entries = (
+            json.loads(self.path.read_text()) if self.path.exists() else {}
+        )
+
+    def is_fresh(self, key, src):
+        e = self.entries.get(key)
+        if e is None or not pathlib.Path(e["output"]).exists():
+            return False
+        st = os.stat(src)
+        if st.st_size != e["size"] or str(src) != e["src"]:
+            return False
+        if st.st_mtime_ns == e["mtime_ns"]:
+            return True
+        if sha256(src) == e["sha256"]:          # same bytes, new mtime
+            e["mtime_ns"] = st.st_mtime_ns
+            return True
+        return False
+
+    def record(self, key, fp, output, rows):
+        self.entries[key] = {**fp, "output": str(output), "rows": rows}
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)          # never leave a half-written manifest
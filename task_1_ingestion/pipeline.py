@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Nightly flatten + convert for every participant.
+
+Discovers all participant_* directories under --root and fans the
+(participant × metric) work items out over a process pool.  By default each
+item writes partitioned Parquet straight from the JSON (flatten.py
+--format parquet); with --format csv it flattens to CSV and converts that
+CSV to Parquet (task_0b/convert.py) as before.  Prints per-item timings and
+a summary.
+
+    python task_1_ingestion/pipeline.py --root task_0b/data --workers 8
+"""
+
+import argparse, importlib.util, os, pathlib, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import flatten
+from manifest import MANIFEST_NAME, Manifest, fingerprint, item_key
+
+ROOT      = pathlib.Path("task_0b/data")
+CONVERT_PY = pathlib.Path(__file__).resolve().parent.parent / "task_0b" / "convert.py"
+
+
+def _load_convert():
+    """task_0b/convert.py is a script, not a package – import it by path."""
+    spec = importlib.util.spec_from_file_location("convert", CONVERT_PY)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def discover(root):
+    return sorted(p for p in root.glob("participant_*") if p.is_dir())
+
+
+def plan(pdirs, metrics):
+    """(participant_dir, metric) items, biggest JSON first for better packing."""
+    items = [
+        (pdir, name)
+        for pdir in pdirs
+        for name in metrics
+        if (pdir / flatten.JSONS[name]).exists()
+    ]
+    return sorted(items, key=lambda it: -(it[0] / flatten.JSONS[it[1]]).stat().st_size)
+
+
+def run_item(pdir, name, stream, columnar, chunk_rows, convert, fmt, out):
+    """Worker: flatten one metric for one participant, then convert it."""
+    t0 = time.perf_counter()
+    fp = fingerprint(pdir / flatten.JSONS[name])
+    out_path, rows = flatten.flatten_one(
+        name, pdir, out, stream=stream, columnar=columnar,
+        chunk_rows=chunk_rows, fmt=fmt,
+    )
+    t1 = time.perf_counter()
+    if fmt == "csv" and convert and out_path is not None:
+        _load_convert().convert_csv(out_path)
+    t2 = time.perf_counter()
+    return {"rows": rows, "flatten": t1 - t0, "convert": t2 - t1,
+            "fp": fp, "output": out_path}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--root", type=pathlib.Path, default=ROOT,
+                    help="directory holding participant_* folders")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="max concurrent processes (default: all cores)")
+    ap.add_argument("--metrics", nargs="+", choices=list(flatten.JSONS),
+                    default=list(flatten.JSONS))
+    ap.add_argument("--stream", action="store_true")
+    ap.add_argument("--columnar", action="store_true")
+    ap.add_argument("--chunk-rows", type=int, default=100_000)
+    ap.add_argument("--format", choices=["parquet", "csv"], default="parquet",
+                    help="parquet: JSON → partitioned Parquet, no CSV stage")
+    ap.add_argument("--out", type=pathlib.Path, default=None,
+                    help="Parquet dataset root (default: flatten.PARQUET_ROOT)")
+    ap.add_argument("--no-convert", dest="convert", action="store_false",
+                    help="csv format only: stop after the CSV stage")
+    ap.add_argument("--force", action="store_true",
+                    help="ignore the manifest and rebuild everything")
+    args = ap.parse_args(argv)
+
+    if args.stream and flatten.ijson is None:
+        raise SystemExit("--stream needs the ijson package (pip install -r task_1_ingestion/requirements.txt)")
+    if args.format == "parquet" and flatten.pq is None:
+        raise SystemExit("--format parquet needs pyarrow")
+
+    pdirs = discover(args.root)
+    manifest = Manifest(args.root / MANIFEST_NAME)
+    items, skipped = [], 0
+    for pdir, name in plan(pdirs, args.metrics):
+        key = item_key(pdir, name, args.format)
+        if not args.force and manifest.is_fresh(key, pdir / flatten.JSONS[name]):
+            skipped += 1
+        else:
+            items.append((pdir, name))
+    print(f"{len(pdirs)} participants, {len(items)} items "
+          f"({skipped} unchanged, skipped), {args.workers} workers")
+
+    t0 = time.perf_counter()
+    ok = failed = rows = 0
+    busy = 0.0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {
+                pool.submit(run_item, pdir, name, args.stream, args.columnar,
+                            args.chunk_rows, args.convert, args.format,
+                            args.out): (pdir, name)
+                for pdir, name in items
+            }
+            for fut in as_completed(futures):
+                pdir, name = futures[fut]
+                tag = f"{pdir.name}/{name}"
+                try:
+                    r = fut.result()
+                except Exception as e:      # keep going, report at the end
+                    failed += 1
+                    print(f"FAILED {tag}: {e!r}")
+                    continue
+                ok += 1
+                rows += r["rows"]
+                busy += r["flatten"] + r["convert"]
+                if r["output"] is not None:
+                    manifest.record(item_key(pdir, name, args.format),
+                                    r["fp"], r["output"], r["rows"])
+                print(f"{tag:<28} rows={r['rows']:>12,}  "
+                      f"flatten={r['flatten']:7.2f}s  convert={r['convert']:7.2f}s")
+    finally:
+        manifest.save()             # keep finished items even if interrupted
+
+    wall = time.perf_counter() - t0
+    print(f"done: {ok} ok, {failed} failed, {rows:,} rows in {wall:.1f}s wall "
+          f"({busy:.1f}s busy, {busy / wall if wall else 0:.1f}x parallel)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for the /data gap-fill: the old per-step Python loop vs
+imputation.fill_gaps, per (range, table) that choose_table can return.
+
+    python bench_imputation.py
+"""
+import bisect, datetime as dt, random, time
+
+from imputation import fill_gaps, iso_strings
+
+UTC = dt.timezone.utc
+CASES = [                       # (label, days, interval, share of points present)
+    ("1 day   raw_data", 1,   dt.timedelta(seconds=1), 0.9),
+    ("7 days  data_1m",  7,   dt.timedelta(minutes=1), 0.9),
+    ("30 days data_1h",  30,  dt.timedelta(hours=1),   0.9),
+    ("1 year  data_1d",  365, dt.timedelta(days=1),    0.9),
+]
+
+
+def legacy(rows, t_start, t_end, interval):
+    """The loop previously inlined in main.get_data."""
+    data_dict = {ts: float(val) for ts, val in rows}
+    known_ts  = sorted(data_dict.keys())
+    full_ts, full_vals, imputed_flags = [], [], []
+    t = t_start
+    while t < t_end:
+        full_ts.append(t)
+        if t in data_dict:
+            full_vals.append(data_dict[t])
+            imputed_flags.append(False)
+        else:
+            i = bisect.bisect_left(known_ts, t)
+            if i == 0:
+                v = data_dict[known_ts[0]]
+            elif i == len(known_ts):
+                v = data_dict[known_ts[-1]]
+            else:
+                t0, t1 = known_ts[i-1], known_ts[i]
+                v0, v1 = data_dict[t0], data_dict[t1]
+                frac = (t - t0).total_seconds() / (t1 - t0).total_seconds()
+                v = v0 + (v1 - v0) * frac
+            full_vals.append(v)
+            imputed_flags.append(True)
+        t += interval
+    return [ts.isoformat() for ts in full_ts], full_vals, imputed_flags
+
+
+def vectorised(rows, t_start, t_end, interval):
+    grid, values, imputed = fill_gaps(rows, t_start, t_end, interval)
+    return iso_strings(grid, UTC), values.tolist(), imputed.tolist()
+
+
+def best_of(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    random.seed(0)
+    print(f"{'case':<18}{'points':>10}{'loop ms':>10}{'numpy ms':>10}{'speedup':>9}")
+    for label, days, interval, share in CASES:
+        t_start = dt.datetime(2024, 1, 1, tzinfo=UTC)
+        t_end   = t_start + dt.timedelta(days=days)
+        n = (t_end - t_start) // interval
+        rows = [(t_start + i * interval, random.uniform(50, 120))
+                for i in range(n) if random.random() < share]
+
+        t_old, old = best_of(legacy, rows, t_start, t_end, interval)
+        t_new, new = best_of(vectorised, rows, t_start, t_end, interval)
+        assert old[0] == new[0] and old[2] == new[2]
+        assert max(abs(a - b) for a, b in zip(old[1], new[1])) < 1e-9
+        print(f"{label:<18}{n:>10,}{t_old * 1e3:>10.1f}{t_new * 1e3:>10.1f}"
+              f"{t_old / t_new:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
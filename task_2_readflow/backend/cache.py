@@ -0,0 +1,81 @@
+"""
+In-memory LRU cache for read-API responses.
+
+Entries are tagged with the ingest version they were computed from
+(ingest_state.updated_at, bumped by ingest.py in the same transaction as the
+rows) and an optional expiry; a lookup only hits when the caller's current
+version matches and the entry has not expired.  Size is bounded in bytes,
+least recently used entries go first.
+"""
+import os, sys, threading, time
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client import Counter, Gauge
+
+MAX_BYTES = int(float(os.getenv("API_CACHE_MB", 256)) * 2**20)
+
+# metrics
+CACHE_REQUESTS = Counter("api_cache_requests_total", "Response cache lookups",
+                         ["endpoint", "result"])        # hit | miss | stale
+CACHE_BYTES    = Gauge("api_cache_bytes", "Approximate size of cached responses")
+CACHE_ENTRIES  = Gauge("api_cache_entries", "Cached responses")
+
+
+def _size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._d = OrderedDict()         # key -> (version, expires, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, endpoint, key, version):
+        with self._lock:
+            e = self._d.get(key)
+            if e is None:
+                result, value = "miss", None
+            elif e[0] != version or (e[1] is not None and time.time() >= e[1]):
+                self._drop(key)
+                result, value = "stale", None
+            else:
+                self._d.move_to_end(key)
+                result, value = "hit", e[3]
+        CACHE_REQUESTS.labels(endpoint, result).inc()
+        return value
+
+    def put(self, key, version, value, ttl=None):
+        """ttl=None: valid until the version changes."""
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            if key in self._d:
+                self._drop(key)
+            self._d[key] = (version, expires, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._d)))
+            self._publish()
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+            self.bytes = 0
+            self._publish()
+
+    def _drop(self, key):
+        self.bytes -= self._d.pop(key)[2]
+        self._publish()
+
+    def _publish(self):
+        CACHE_BYTES.set(self.bytes)
+        CACHE_ENTRIES.set(len(self._d))
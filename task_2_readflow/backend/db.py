@@ -0,0 +1,104 @@
+"""
+Shared Postgres connection pool for the read API.
+
+Handlers are sync and FastAPI runs them on its worker threads, so a
+ThreadedConnectionPool is enough: connections are opened once and handed
+out per request instead of paying a TCP + auth handshake every time.
+
+    with get_conn() as conn, conn.cursor() as cur:
+        ...
+
+Pool usage and wait time are exported on the app's /metrics.
+"""
+import os, threading, time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from prometheus_client import Counter, Gauge, Histogram
+
+POOL_MIN     = int(os.getenv("PGPOOL_MIN", 1))
+POOL_MAX     = int(os.getenv("PGPOOL_MAX", 10))
+POOL_TIMEOUT = float(os.getenv("PGPOOL_TIMEOUT", 5))    # s to wait for a free conn
+
+# metrics
+POOL_SIZE   = Gauge("db_pool_max_connections", "Configured pool size")
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections checked out")
+POOL_OPEN   = Gauge("db_pool_connections_open", "Connections currently open")
+POOL_WAIT   = Histogram("db_pool_wait_seconds", "Time waiting for a connection",
+                        buckets=(.001, .005, .01, .05, .1, .5, 1, 2, 5))
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total",
+                        "Requests that gave up waiting for a connection")
+POOL_SIZE.set(POOL_MAX)
+
+_pool  = None
+_lock  = threading.Lock()
+# ThreadedConnectionPool raises instead of blocking when it is exhausted;
+# the semaphore makes callers queue for a slot instead
+_slots = threading.BoundedSemaphore(POOL_MAX)
+
+
+def _open_count():
+    p = _pool                       # close() may reset it between scrapes
+    return 0 if p is None else len(p._pool) + len(p._used)
+
+
+POOL_OPEN.set_function(_open_count)
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    POOL_MIN, POOL_MAX,
+                    host=os.getenv("PGHOST", "db"),
+                    port=os.getenv("PGPORT", "5432"),
+                    user=os.getenv("PGUSER", "postgres"),
+                    password=os.getenv("PGPASSWORD", "postgres"),
+                    dbname=os.getenv("PGDATABASE", "wearables"),
+                )
+    return _pool
+
+
+@contextmanager
+def get_conn():
+    """
+    Borrow a pooled connection; commit on success, roll back on error.
+    Raises PoolError if none frees up within PGPOOL_TIMEOUT seconds.
+    """
+    t0 = time.perf_counter()
+    if not _slots.acquire(timeout=POOL_TIMEOUT):
+        POOL_TIMEOUTS.inc()
+        raise PoolError(f"no database connection free after {POOL_TIMEOUT}s")
+    try:
+        p = pool()
+        conn = p.getconn()
+    except Exception:
+        _slots.release()
+        raise
+    POOL_WAIT.observe(time.perf_counter() - t0)
+    POOL_IN_USE.inc()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass                    # already broken; closed below
+        raise
+    finally:
+        # drop connections the server closed under us (restart, idle kill)
+        p.putconn(conn, close=bool(conn.closed))
+        POOL_IN_USE.dec()
+        _slots.release()
+
+
+def close():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -0,0 +1,81 @@
+"""
+Server-side downsampling for /data: pick at most max_points indices from a
+gap-filled series so the chart keeps its shape without shipping every step.
+
+Both methods return indices into the input, so timestamps, values and the
+imputed flags of the kept points are passed through untouched.
+"""
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson 2013).  Keeps the first and
+    last point; from each of the n_out-2 buckets in between keeps the point
+    forming the largest triangle with the previously kept point and the
+    mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)   # n_out-2 buckets
+    # mean of every bucket up front; the one after the last is the end point
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.r_[sums_x / counts, x[-1]]
+    avg_y = np.r_[sums_y / counts, y[-1]]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a])
+                      - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Per-bucket min and max (n_out/2 buckets), in time order.  Keeps every
+    spike, at the cost of a more jagged line than LTTB.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    keep = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        seg = y[lo:hi]
+        keep += [lo + int(np.argmin(seg)), lo + int(np.argmax(seg))]
+    return np.unique(keep)
+
+
+def bucket_edges(n: int, n_out: int) -> np.ndarray:
+    """n_out+1 edges splitting range(n) into near-equal buckets (n_out < n)."""
+    return np.linspace(0, n, n_out + 1).astype(np.int64)
+
+
+def bucket_mean(y: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Mean of y per bucket.  Unlike lttb/minmax the buckets depend only on
+    the grid, so series on a shared grid stay aligned after downsampling.
+    """
+    return np.add.reduceat(y, edges[:-1]) / np.diff(edges)
+
+
+def downsample(x, y, n_out, method="lttb"):
+    if method == "lttb":
+        return lttb(x, y, n_out)
+    if method == "minmax":
+        return minmax(x, y, n_out)
+    raise ValueError(f"unknown downsample method {method!r}")
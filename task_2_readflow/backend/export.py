@@ -0,0 +1,79 @@
+"""
+Streaming raw-data export for /data/export.
+
+Rows come off a server-side (named) cursor in batches of BATCH_ROWS and are
+encoded and yielded one batch at a time, so memory per request stays flat
+no matter how many months are exported.
+"""
+import json, os, sys
+from contextlib import ExitStack
+from typing import Iterator, Optional
+
+from db import get_conn
+
+BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 50_000))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _value(v):
+    return "" if v is None else repr(float(v))
+
+
+def encode_csv(rows) -> str:
+    return "".join(
+        f"{ts.isoformat()},{p},{m},{_value(v)}\n" for ts, p, m, v in rows
+    )
+
+
+def encode_ndjson(rows) -> str:
+    # metric names are plain identifiers, but quote them properly anyway
+    return "".join(
+        f'{{"ts":"{ts.isoformat()}","participant":{p},"metric":{json.dumps(m)},'
+        f'"value":{"null" if v is None else repr(float(v))}}}\n'
+        for ts, p, m, v in rows
+    )
+
+
+def stream_raw(start, end, user_id: int, metric: Optional[str],
+               fmt: str) -> Iterator[bytes]:
+    """
+    raw_data rows for ts in [start, end), ordered, as encoded byte chunks.
+
+    The connection is borrowed and the first batch fetched before this
+    returns, so a pool timeout (PoolError) or a rejected parameter raises
+    here, while the handler can still answer 503 / 404, instead of cutting
+    off a 200 body.  The returned iterator releases the connection.
+    """
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    sql = """
+        SELECT ts, participant, metric, value
+        FROM   raw_data
+        WHERE  ts >= %(t0)s AND ts < %(t1)s
+          AND  participant = %(user)s
+    """ + ("  AND  metric = %(metric)s\n" if metric else "") + """
+        ORDER  BY ts, metric
+    """
+    params = {"t0": start, "t1": end, "user": user_id, "metric": metric}
+
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(get_conn())
+        cur = stack.enter_context(conn.cursor(name="raw_export"))
+        cur.itersize = BATCH_ROWS
+        cur.execute(sql, params)
+        rows = cur.fetchmany(BATCH_ROWS)
+    except BaseException:
+        stack.__exit__(*sys.exc_info())     # roll back + return the connection
+        raise
+    header = b"ts,participant,metric,value\n" if fmt == "csv" else b""
+    return _batches(stack, cur, rows, encode, header)
+
+
+def _batches(stack, cur, rows, encode, header) -> Iterator[bytes]:
+    with stack:
+        if header:
+            yield header
+        while rows:
+            yield encode(rows).encode()
+            rows = cur.fetchmany(BATCH_ROWS)
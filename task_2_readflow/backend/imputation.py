@@ -0,0 +1,64 @@
+"""
+Gap-filling for /data: reindex the queried rows onto a fixed grid and
+linearly interpolate the holes, all on numpy arrays.
+"""
+import datetime as dt
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_US    = dt.timedelta(microseconds=1)
+
+
+def to_us(t: dt.datetime) -> int:
+    """tz-aware datetime → integer µs since the Unix epoch."""
+    return (t - _EPOCH) // _US
+
+
+def fill_gaps(
+    rows: Sequence[Tuple[dt.datetime, float]],
+    t_start: dt.datetime,
+    t_end: dt.datetime,
+    interval: dt.timedelta,
+    col: int = 1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    rows: (ts, value, …) sorted by ts, tz-aware; col picks the value column.
+    Returns (grid_us, values, imputed) for every step in [t_start, t_end):
+    points present in rows keep their value, every other point is linearly
+    interpolated between its neighbours (held flat before the first / after
+    the last known point) and flagged imputed.
+    """
+    known = np.fromiter((to_us(r[0]) for r in rows), np.int64, len(rows))
+    vals  = np.fromiter((r[col] for r in rows), np.float64, len(rows))
+    # duplicate timestamps: keep the last, like the old dict-based lookup
+    last = np.r_[known[1:] != known[:-1], True]
+    known, vals = known[last], vals[last]
+
+    step = interval // _US
+    grid = np.arange(to_us(t_start), to_us(t_end), step, dtype=np.int64)
+
+    idx = np.searchsorted(known, grid)
+    hit = idx < len(known)
+    hit[hit] = known[idx[hit]] == grid[hit]
+
+    values = np.interp(grid, known, vals)     # exact at knots, clamped at ends
+    values[hit] = vals[idx[hit]]
+    return grid, values, ~hit
+
+
+def utc_offset(tz: dt.tzinfo) -> dt.timedelta:
+    """Offset of a fixed-offset tz (what psycopg2 hands back for timestamptz)."""
+    return dt.datetime(2000, 1, 1, tzinfo=tz).utcoffset() or dt.timedelta(0)
+
+
+def iso_strings(grid_us: np.ndarray, tz: dt.tzinfo) -> List[str]:
+    """
+    µs grid → isoformat() strings in a fixed-offset tz, matching
+    datetime.isoformat() for whole-second timestamps.
+    """
+    offset = utc_offset(tz)
+    suffix = dt.datetime(2000, 1, 1, tzinfo=tz).isoformat()[19:]
+    local = (grid_us + offset // _US).astype("datetime64[us]")
+    return [s + suffix for s in np.datetime_as_string(local, unit="s").tolist()]
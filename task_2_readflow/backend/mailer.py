@@ -0,0 +1,194 @@
+"""
+Background e-mail delivery for /notify.
+
+Handlers only build the message and put it on a bounded queue; one worker
+thread drains it, up to MAIL_BATCH messages at a time, over a single SMTP
+session that stays open between batches (closed after MAIL_IDLE_CLOSE
+seconds without mail).  A failed send reconnects and is retried with
+backoff up to MAIL_RETRIES times before the message is counted as failed.
+
+    mailer.start()                      # on app startup
+    mailer.enqueue(to, subject, body)   # False when the queue is full
+    mailer.enqueue_many(mails)          # all or nothing
+    mailer.stop()                       # on shutdown, drains what is queued
+
+Queue depth, delivery latency and outcomes are exported on the app's
+/metrics.
+"""
+import email.message, os, queue, smtplib, threading, time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+SMTP_HOST   = os.getenv("SMTP_HOST", "mailhog")
+SMTP_PORT   = int(os.getenv("SMTP_PORT", 1025))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+MAIL_FROM   = os.getenv("MAIL_FROM", "clinician@wearipedia.local")
+QUEUE_MAX   = int(os.getenv("MAIL_QUEUE_MAX", 10_000))
+BATCH       = int(os.getenv("MAIL_BATCH", 50))          # messages per session turn
+RETRIES     = int(os.getenv("MAIL_RETRIES", 3))
+BACKOFF     = float(os.getenv("MAIL_BACKOFF", 1))       # s, doubled per retry
+IDLE_CLOSE  = float(os.getenv("MAIL_IDLE_CLOSE", 30))   # s before QUIT
+
+# metrics
+MAIL_QUEUE   = Gauge("mail_queue_depth", "Messages waiting to be sent")
+MAIL_LATENCY = Histogram("mail_delivery_seconds", "Enqueue to accepted by SMTP",
+                         buckets=(.01, .05, .1, .5, 1, 5, 10, 30, 60))
+MAIL_SEND    = Histogram("mail_smtp_send_seconds", "SMTP round-trip per message",
+                         buckets=(.001, .005, .01, .05, .1, .5, 1, 5))
+MAIL_BATCHES = Histogram("mail_batch_size", "Messages sent per batch",
+                         buckets=(1, 2, 5, 10, 20, 50, 100))
+MAIL_TOTAL   = Counter("mail_messages_total", "Messages by outcome",
+                       ["result"])      # sent | failed | rejected
+MAIL_RETRIES = Counter("mail_retries_total", "Send attempts that were retried")
+MAIL_CONNECTS = Counter("mail_smtp_connections_total", "SMTP sessions opened")
+
+_queue = queue.Queue(maxsize=QUEUE_MAX)
+MAIL_QUEUE.set_function(_queue.qsize)
+_put_lock = threading.Lock()
+_STOP = object()
+_worker = None
+
+
+def message(to_addr: str, subject: str, body: str) -> email.message.EmailMessage:
+    msg = email.message.EmailMessage()
+    msg["From"]    = MAIL_FROM
+    msg["To"]      = to_addr
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+def enqueue(to_addr: str, subject: str, body: str) -> bool:
+    """Queue one message; False (and counted as rejected) if the queue is full."""
+    return enqueue_many([(to_addr, subject, body)])
+
+
+def enqueue_many(mails) -> bool:
+    """
+    Queue every (to, subject, body) or none of them: False (all counted as
+    rejected) if they don't all fit, so a client retrying a rejected batch
+    never causes duplicates.
+    """
+    msgs = [message(*m) for m in mails]
+    # producers serialise on the lock; the worker only takes items out, so
+    # free space can only grow between the check and the puts
+    with _put_lock:
+        if QUEUE_MAX - _queue.qsize() < len(msgs):
+            MAIL_TOTAL.labels("rejected").inc(len(msgs))
+            return False
+        now = time.perf_counter()
+        for msg in msgs:
+            _queue.put_nowait((now, msg))
+    return True
+
+
+class _Session:
+    """One lazily (re)opened SMTP connection."""
+
+    def __init__(self):
+        self.smtp = None
+
+    def send(self, msg):
+        if self.smtp is None:
+            self.smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+            MAIL_CONNECTS.inc()
+        t0 = time.perf_counter()
+        self.smtp.send_message(msg)
+        MAIL_SEND.observe(time.perf_counter() - t0)
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass                # server already gone
+            self.smtp = None
+
+    def drop(self):
+        """After an error: discard the connection so the next send reconnects."""
+        if self.smtp is not None:
+            try:
+                self.smtp.close()
+            except OSError:
+                pass
+            self.smtp = None
+
+
+def _smtp_code(exc) -> int:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return min(code for code, _ in exc.recipients.values())
+    return getattr(exc, "smtp_code", 0)
+
+
+def _deliver(session: _Session, queued_at: float, msg) -> None:
+    for attempt in range(RETRIES + 1):
+        try:
+            session.send(msg)
+        except (smtplib.SMTPException, OSError) as exc:
+            session.drop()
+            # permanent (5xx) rejections won't improve on retry, 4xx might
+            if _smtp_code(exc) >= 500 or attempt == RETRIES:
+                print(f"mail to {msg['To']} failed: {exc!r}")
+                MAIL_TOTAL.labels("failed").inc()
+                return
+            MAIL_RETRIES.inc()
+            time.sleep(BACKOFF * 2 ** attempt)
+        else:
+            MAIL_TOTAL.labels("sent").inc()
+            MAIL_LATENCY.observe(time.perf_counter() - queued_at)
+            return
+
+
+def _run() -> None:
+    session = _Session()
+    stopping = False
+    while not stopping:
+        try:
+            item = _queue.get(timeout=IDLE_CLOSE if session.smtp else None)
+        except queue.Empty:
+            session.close()             # idle: don't hold the server's slot
+            continue
+        batch = [item]
+        while len(batch) < BATCH:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        if _STOP in batch:
+            # stop() queues the sentinel last, so everything before it is mail
+            stopping = True
+            batch = [b for b in batch if b is not _STOP]
+        for queued_at, msg in batch:
+            _deliver(session, queued_at, msg)
+        if batch:
+            MAIL_BATCHES.observe(len(batch))
+    session.close()
+
+
+def start() -> None:
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, name="mailer", daemon=True)
+        _worker.start()
+
+
+def stop(timeout: float = 10) -> None:
+    """
+    Send what is already queued, then QUIT – but return after timeout
+    seconds whatever the worker is doing (SMTP down, retries backing off);
+    it is a daemon thread, so anything still queued is dropped at exit.
+    """
+    global _worker
+    if _worker is None:
+        return
+    deadline = time.monotonic() + timeout
+    try:
+        _queue.put(_STOP, timeout=timeout)      # full queue: wait for room
+    except queue.Full:
+        pass
+    _worker.join(max(0.0, deadline - time.monotonic()))
+    if _worker.is_alive():
+        with _queue.mutex:
+            left = sum(item is not _STOP for item in _queue.queue)
+        print(f"mailer: gave up after {timeout}s, {left} queued messages not sent")
+    _worker = None
@@ -1,12 +1,20 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
+import numpy as np
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import os, psycopg2, datetime as dt
+from typing import List, Literal, Optional
+import os, itertools, time, datetime as dt
 from datetime import timedelta
-import bisect
-import smtplib, email.message
 from prometheus_fastapi_instrumentator import Instrumentator
+from psycopg2.errors import InvalidTextRepresentation
+
+import db
+from db import get_conn
+from cache import LRUCache
+from imputation import fill_gaps, iso_strings, utc_offset
+from downsample import bucket_edges, bucket_mean, downsample
+import packed, export, mailer
 
 app = FastAPI(title="Wearables Read-API")
 
@@ -21,28 +29,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_conn():
-    return psycopg2.connect(
-        host=os.getenv("PGHOST", "db"),
-        port=os.getenv("PGPORT", "5432"),
-        user=os.getenv("PGUSER", "postgres"),
-        password=os.getenv("PGPASSWORD", "postgres"),
-        dbname=os.getenv("PGDATABASE", "wearables"),
-    )
+@app.on_event("startup")
+def _start_mailer():
+    mailer.start()
 
+@app.on_event("shutdown")
+def _shutdown():
+    mailer.stop()
+    db.close()
 
-SMTP_HOST = os.getenv("SMTP_HOST", "mailhog")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 1025))
+@app.exception_handler(db.PoolError)
+def _pool_exhausted(request: Request, exc: db.PoolError):
+    return JSONResponse({"detail": str(exc)}, status_code=503)
 
-def send_mail(to_addr: str, subject: str, body: str):
-    msg = email.message.EmailMessage()
-    msg["From"] = "clinician@wearipedia.local"
-    msg["To"]   = to_addr
-    msg["Subject"] = subject
-    msg.set_content(body)
+# with RAW_LAYOUT=compact raw_data.metric (and the aggregates built on it) is
+# an enum, so a metric name it doesn't know fails the cast instead of
+# matching no rows
+@app.exception_handler(InvalidTextRepresentation)
+def _unknown_metric(request: Request, exc: InvalidTextRepresentation):
+    return JSONResponse({"detail": "unknown metric"}, status_code=404)
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
-        s.send_message(msg)
 
 class Participant(BaseModel):
     id:   int
@@ -68,24 +74,232 @@ class TSResponse(BaseModel):
     timestamps: List[str]
     values:     List[float]
     imputed:    List[bool]
+    value_min:  Optional[List[float]] = None   # envelope=true only
+    value_max:  Optional[List[float]] = None
+
+# tables by resolution, coarsest first: (table, timestamp column, step)
+RESOLUTIONS = [
+    ("data_1d",  "bucket", timedelta(days=1)),
+    ("data_1h",  "bucket", timedelta(hours=1)),
+    ("data_1m",  "bucket", timedelta(minutes=1)),
+    ("raw_data", "ts",     timedelta(seconds=1)),
+]
+STEP = {table: step for table, _, step in RESOLUTIONS}
+
+class Series(BaseModel):
+    user_id: int
+    metric:  str
+    values:  List[Optional[float]]   # null where the series has no data at all
+    imputed: List[bool]
+
+class BatchResponse(BaseModel):
+    timestamps: List[str]            # shared by every series
+    table:      str
+    series:     List[Series]
+
+MAX_BATCH_SERIES = int(os.getenv("MAX_BATCH_SERIES", 100))
+
+# retention tiers, opt-in on the ingestor (RAW_RETENTION / AGG_1M_RETENTION,
+# mirrored here): old raw chunks and 1-minute buckets are dropped once the
+# coarser aggregates are materialized; data_1h / data_1d are kept.  Only for
+# a table with retention on, a window starting before its oldest remaining
+# chunk steps up to the next coarser table.
+RETAINED = {table for table, env in (("raw_data", "RAW_RETENTION"),
+                                     ("data_1m",  "AGG_1M_RETENTION"))
+            if os.getenv(env)}
+COARSER = {"raw_data": ("data_1m", "bucket"), "data_1m": ("data_1h", "bucket")}
+OLDEST_TTL = 300                    # s; chunks are only dropped by ingest runs
+_oldest: dict = {}                  # table -> (checked_at, oldest chunk start)
+
+
+def oldest_chunk(table: str) -> Optional[dt.datetime]:
+    """Start of the oldest chunk still holding table's rows (None: no chunks)."""
+    hit = _oldest.get(table)
+    if hit is not None and time.monotonic() - hit[0] < OLDEST_TTL:
+        return hit[1]
+    with get_conn() as conn, conn.cursor() as cur:
+        # a continuous aggregate's chunks belong to its materialization table
+        cur.execute("""
+            SELECT min(c.range_start)
+            FROM   timescaledb_information.chunks c
+            LEFT   JOIN timescaledb_information.continuous_aggregates a
+                   ON a.view_name = %(t)s
+            WHERE  c.hypertable_name = COALESCE(a.materialization_hypertable_name, %(t)s)
+        """, {"t": table})
+        oldest = cur.fetchone()[0]
+    _oldest[table] = (time.monotonic(), oldest)
+    return oldest
+
+
+def retained(table: str, ts_col: str, start_date: dt.date):
+    """Step up to a coarser table while start_date predates table's data."""
+    t0 = dt.datetime.combine(start_date, dt.time.min, tzinfo=dt.timezone.utc)
+    while table in RETAINED:
+        oldest = oldest_chunk(table)
+        if oldest is not None and t0 >= oldest:
+            break
+        table, ts_col = COARSER[table]
+    return table, ts_col
+
+
+def choose_table(start_date: dt.date, end_date: dt.date,
+                 target_points: Optional[int] = None):
+    """
+    With a point budget: the coarsest table that still yields at least
+    target_points grid steps over the window, so downsampling has enough
+    detail to work with and nothing finer is read.  Without one: fixed
+    span thresholds.  Either way never a table whose rows for start_date
+    have already been dropped by (opt-in) retention.
+    """
+    if target_points is not None:
+        span = end_date + timedelta(days=1) - start_date
+        for table, ts_col, step in RESOLUTIONS:
+            if span // step >= target_points:
+                return retained(table, ts_col, start_date)
+        return retained("raw_data", "ts", start_date)
 
-def choose_table(start_date: dt.date, end_date: dt.date):
     delta = end_date - start_date
     if delta <= timedelta(days=1):
-        return "raw_data", "ts"
+        return retained("raw_data", "ts", start_date)
     elif delta <= timedelta(days=7):
-        return "data_1m", "bucket"
+        return retained("data_1m", "bucket", start_date)
     elif delta <= timedelta(days=30):
         return "data_1h", "bucket"
     else:
         return "data_1d", "bucket"
     
+# continuous-aggregate policies from sql/aggregates.sql:
+# table -> (start_offset, end_offset, schedule_interval).  Buckets older than
+# start_offset are never refreshed again; newer ones may change every
+# schedule_interval; nothing newer than end_offset is materialized at all.
+AGG_POLICY = {
+    "data_1m": (timedelta(days=7),  timedelta(hours=1), timedelta(hours=1)),
+    "data_1h": (timedelta(days=7),  timedelta(days=1),  timedelta(hours=6)),
+    "data_1d": (timedelta(days=30), timedelta(days=7),  timedelta(days=1)),
+}
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+
+def materialized_until(table: str, now: Optional[dt.datetime] = None) -> dt.datetime:
+    """
+    Conservative edge of what the aggregate's refresh policy has
+    materialized: the last run covered up to (run time - end_offset), and
+    the last run may be one schedule_interval old.  Bucket-aligned.
+    """
+    _, end_offset, every = AGG_POLICY[table]
+    t = (now or dt.datetime.now(dt.timezone.utc)) - end_offset - every
+    step = STEP[table]
+    return _EPOCH + ((t - _EPOCH) // step) * step
+
+def series_query(table: str, ts_col: str, t0, t1, users, metrics, keyed=False,
+                 envelope=False):
+    """
+    SQL + params for (ts, value) in [t0, t1) of every (participant, metric)
+    in users × metrics; keyed=True prefixes each row with participant,
+    metric and orders by them, envelope=True appends per-bucket min, max.  For an aggregate whose window reaches past
+    materialized_until, the tail is bucketed on the fly from the level
+    below so recent points are neither missing nor stale.
+    """
+    params = {"t0": t0, "t1": t1, "users": tuple(users), "metrics": tuple(metrics)}
+    keys  = "participant, metric, " if keyed else ""
+    order = "ORDER BY participant, metric, ts" if keyed else "ORDER BY ts"
+    where = """
+      AND  participant IN %(users)s
+      AND  metric IN %(metrics)s
+    """
+    env = ""
+    if envelope:
+        env = (", value AS value_min, value AS value_max" if table == "raw_data"
+               else ", value_min, value_max")
+    base = f"""
+    SELECT {keys}{ts_col} AS ts, value{env}
+    FROM   {table}
+    WHERE  {ts_col} >= %(t0)s AND {ts_col} < %(t1)s {where}
+    """
+    if table == "raw_data":
+        return base + order, params
+
+    horizon = materialized_until(table)
+    if dt.datetime.combine(t1, dt.time.min, tzinfo=dt.timezone.utc) <= horizon:
+        return base + order, params
+
+    params.update(horizon=horizon, step=STEP[table])
+    # the tail comes from the next finer level: raw rows for data_1m, the
+    # (real-time) data_1m sums/counts for anything coarser
+    if table == "data_1m":
+        src, t, agg = "raw_data", "ts", "AVG(value)"
+        tail_env = ", MIN(value) AS value_min, MAX(value) AS value_max"
+    else:
+        src, t, agg = "data_1m", "bucket", "SUM(value_sum) / NULLIF(SUM(samples), 0)"
+        tail_env = ", MIN(value_min) AS value_min, MAX(value_max) AS value_max"
+    if not envelope:
+        tail_env = ""
+    sql = f"""
+    SELECT {keys}{ts_col} AS ts, value{env}
+    FROM   {table}
+    WHERE  {ts_col} >= %(t0)s AND {ts_col} < LEAST(%(t1)s::timestamptz, %(horizon)s) {where}
+    UNION ALL
+    SELECT {keys}time_bucket(%(step)s, {t}) AS ts, {agg} AS value{tail_env}
+    FROM   {src}
+    WHERE  {t} >= GREATEST(%(t0)s::timestamptz, %(horizon)s) AND {t} < %(t1)s {where}
+    GROUP  BY {"1, 2, 3" if keyed else "1"}
+    {order}
+    """
+    return sql, params
+
+_cache = LRUCache()
+
+def ingest_version(cur, participant: int, metric: Optional[str] = None):
+    """
+    When data for (participant, metric) last changed, per ingest_state –
+    or for any of the participant's metrics / the whole cohort.
+    """
+    if metric is not None:
+        cur.execute("SELECT updated_at FROM ingest_state "
+                    "WHERE participant = %s AND metric = %s", (participant, metric))
+    elif participant is not None:
+        cur.execute("SELECT MAX(updated_at) FROM ingest_state "
+                    "WHERE participant = %s", (participant,))
+    else:
+        cur.execute("SELECT MAX(updated_at) FROM ingest_state")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def cache_ttl(table: str, end_date: dt.date) -> Optional[float]:
+    """
+    raw_data only changes through ingest (caught by the version); an
+    aggregate window still inside its refresh range can also change when
+    the policy runs, so it expires after one schedule_interval.
+    """
+    if table not in AGG_POLICY:
+        return None
+    start_offset, _, every = AGG_POLICY[table]
+    window_end = dt.datetime.combine(end_date + dt.timedelta(days=1), dt.time.min,
+                                     tzinfo=dt.timezone.utc)
+    if window_end < dt.datetime.now(dt.timezone.utc) - start_offset:
+        return None
+    return every.total_seconds()
+
 class AdherenceResponse(BaseModel):
     no_token:        bool
     last_upload:     Optional[str]  # ISO timestamp or null
     sleep_upload_pct: float          # 0–100
     wear_time_pct:    float          # 0–100
 
+class CohortAdherence(AdherenceResponse):
+    user_id: int
+
+class CohortResponse(BaseModel):
+    total: int                       # participants in the cohort
+    items: List[CohortAdherence]     # this page, worst first
+
+# worst-first ordering per sort key; participant breaks ties so pages are stable
+_COHORT_ORDER = {
+    "wear_time":    "wear_time_pct ASC, sleep_upload_pct ASC, participant",
+    "sleep_upload": "sleep_upload_pct ASC, wear_time_pct ASC, participant",
+    "last_upload":  "last_ts ASC NULLS FIRST, participant",     # never uploaded first
+}
+
 class NotifyRequest(BaseModel):
     user_id:     int
     start_date:  dt.date
@@ -102,58 +316,143 @@ def get_adherence(
     end_date:   dt.date = Query(...),
     user_id:    int     = Query(1),
 ):
+    key = ("adherence", user_id, start_date, end_date)
+
     # no_token: here we always have a token for synthetic data
     no_token = False
 
-    # last_upload: max timestamp in raw_data
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT MAX(ts) FROM raw_data
-            WHERE participant = %s
-        """, (user_id,))
-        last = cur.fetchone()[0]
-    last_upload = last.isoformat() if last else None
-
-    # sleep_upload_pct: % of days in range with ANY 'activity' data
-    # (we'll approximate sleep upload by days with activity entries)
     total_days = (end_date - start_date).days + 1
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT COUNT(DISTINCT DATE(ts))
-            FROM raw_data
-            WHERE participant = %s
-              AND metric = 'activity'
-              AND ts >= %s
-              AND ts < %s
-        """, (user_id, start_date, end_date + dt.timedelta(days=1)))
-        days_reported = cur.fetchone()[0] or 0
-    sleep_upload_pct = round(100 * days_reported / total_days, 2)
-
-    # wear_time_pct: % of expected hr points present
     expected = total_days * 24 * 60 * 60
+
+    # one pass over the daily rollup (sql/aggregates.sql: adherence_1d)
+    #   last_upload:      latest ts ever seen for the participant
+    #   sleep_upload_pct: % of days in range with ANY 'activity' data
+    #                     (we approximate sleep upload by days with activity entries)
+    #   wear_time_pct:    % of expected hr points present
     with get_conn() as conn, conn.cursor() as cur:
+        version = ingest_version(cur, user_id)
+        hit = _cache.get("adherence", key, version)
+        if hit is not None:
+            return hit
         cur.execute("""
-            SELECT COUNT(*)
-            FROM raw_data
-            WHERE participant = %s
-              AND metric = 'hr'
-              AND ts BETWEEN %s AND %s
-        """, (user_id, start_date, end_date + dt.timedelta(days=1)))
-        hr_count = cur.fetchone()[0] or 0
+            SELECT MAX(last_ts),
+                   COUNT(*) FILTER (WHERE activity_rows > 0
+                                      AND day >= %(start)s AND day < %(end)s),
+                   SUM(hr_samples) FILTER (WHERE day >= %(start)s AND day < %(end)s)
+            FROM   adherence_1d
+            WHERE  participant = %(user)s
+        """, {"user": user_id, "start": start_date,
+              "end": end_date + dt.timedelta(days=1)})
+        last, days_reported, hr_count = cur.fetchone()
+    days_reported = days_reported or 0
+    hr_count = hr_count or 0
+
+    last_upload = last.isoformat() if last else None
+    sleep_upload_pct = round(100 * days_reported / total_days, 2)
     wear_time_pct = round(100 * hr_count / expected, 2)
 
-    return AdherenceResponse(
+    resp = AdherenceResponse(
         no_token=no_token,
         last_upload=last_upload,
         sleep_upload_pct=sleep_upload_pct,
         wear_time_pct=wear_time_pct
     )
-
-@app.post("/notify")
-def notify_participant(req: NotifyRequest):
+    # adherence_1d is real-time, so it only changes when ingest does
+    _cache.put(key, version, resp)
+    return resp
+
+@app.get("/adherence/cohort", response_model=CohortResponse)
+def get_cohort_adherence(
+    start_date:  dt.date = Query(...),
+    end_date:    dt.date = Query(...),
+    sort:        Literal["wear_time", "sleep_upload", "last_upload"] = Query("wear_time"),
+    page_size:   int     = Query(100, ge=1, le=1000),
+    page_number: int     = Query(0, ge=0),
+):
     """
-    queue an e-mail via mailhog (SMTP on localhost:1025).
+    Adherence for every participant in one set-based query over
+    adherence_1d, same definitions as /adherence, worst first.  Starts from
+    the roster, so participants who never uploaded are listed (0 %, no
+    last upload) instead of dropped.
+    """
+    if end_date < start_date:
+        raise HTTPException(400, "end_date earlier than start_date")
+
+    total_days = (end_date - start_date).days + 1
+    # roster: the participant list plus anyone with data but no entry
+    roster = """roster AS (
+            SELECT unnest(%(roster)s::int[]) AS participant
+            UNION
+            SELECT DISTINCT participant FROM adherence_1d
+        )"""
+    sql = f"""
+        WITH {roster},
+        per AS (
+            SELECT participant,
+                   MAX(last_ts) AS last_ts,
+                   COUNT(*) FILTER (WHERE activity_rows > 0
+                                      AND day >= %(start)s AND day < %(end)s)
+                                                    AS days_reported,
+                   COALESCE(SUM(hr_samples) FILTER (WHERE day >= %(start)s
+                                                      AND day < %(end)s), 0)
+                                                    AS hr_count
+            FROM   adherence_1d
+            GROUP  BY participant
+        )
+        SELECT r.participant,
+               per.last_ts,
+               ROUND(100.0 * COALESCE(per.days_reported, 0) / %(days)s, 2)
+                                                              AS sleep_upload_pct,
+               ROUND(100.0 * COALESCE(per.hr_count, 0) / %(expected)s, 2)
+                                                              AS wear_time_pct,
+               COUNT(*) OVER ()                               AS total
+        FROM   roster r
+        LEFT   JOIN per USING (participant)
+        ORDER  BY {_COHORT_ORDER[sort]}
+        LIMIT  %(limit)s OFFSET %(offset)s
     """
+    params = {
+        "roster": [p.id for p in _FAKE_PARTICIPANTS],
+        "start": start_date,
+        "end": end_date + dt.timedelta(days=1),
+        "days": total_days,
+        "expected": total_days * 24 * 60 * 60,
+        "limit": page_size,
+        "offset": page_number * page_size,
+    }
+    key = ("cohort", start_date, end_date, sort, page_size, page_number)
+    with get_conn() as conn, conn.cursor() as cur:
+        version = ingest_version(cur, None)
+        hit = _cache.get("cohort", key, version)
+        if hit is not None:
+            return hit
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    items = [
+        CohortAdherence(
+            user_id=pid,
+            no_token=False,          # synthetic data always has a token
+            last_upload=last.isoformat() if last else None,
+            sleep_upload_pct=float(sleep),
+            wear_time_pct=float(wear),
+        )
+        for pid, last, sleep, wear, _ in rows
+    ]
+    # past the last page the window count is gone, so count separately
+    if rows:
+        total = rows[0][4]
+    else:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(f"WITH {roster} SELECT COUNT(*) FROM roster", params)
+            total = cur.fetchone()[0]
+    resp = CohortResponse(total=total, items=items)
+    _cache.put(key, version, resp)
+    return resp
+
+MAX_NOTIFY_BATCH = int(os.getenv("MAX_NOTIFY_BATCH", 1000))
+
+def notify_message(req: NotifyRequest):
     subject = f"Action required – Fitbit adherence alert for participant {req.user_id}"
     body = (
         f"Hello Participant {req.user_id},\n\n"
@@ -164,87 +463,192 @@ def notify_participant(req: NotifyRequest):
         "Thank you."
     )
     # in a real deployment `to_addr` would be the participant’s e-mail.
-    send_mail("participant@example.com", subject, body)
+    return "participant@example.com", subject, body
+
+@app.post("/notify", status_code=202)
+def notify_participant(req: NotifyRequest):
+    """
+    queue an e-mail for the background mailer (mailhog, SMTP on :1025);
+    returns as soon as it is queued, 503 if the queue is full.
+    """
+    if not mailer.enqueue(*notify_message(req)):
+        raise HTTPException(503, "mail queue full, try again later")
     return {"status": "queued"}
 
-@app.get("/data", response_model=TSResponse)
-def get_data(
+@app.post("/notify/batch", status_code=202)
+def notify_batch(reqs: List[NotifyRequest]):
+    """
+    queue one e-mail per request, e.g. a cohort-wide alert; they go out over
+    the mailer's single SMTP session instead of a connection each.
+    """
+    if len(reqs) > MAX_NOTIFY_BATCH:
+        raise HTTPException(422, f"at most {MAX_NOTIFY_BATCH} notifications per batch")
+    # all or nothing, so retrying a 503 never sends anything twice
+    if not mailer.enqueue_many(notify_message(r) for r in reqs):
+        raise HTTPException(503, f"mail queue has no room for {len(reqs)} messages, "
+                                 "nothing was queued; try again later")
+    return {"status": "queued", "queued": len(reqs)}
+
+@app.get("/data/export")
+def export_data(
     start_date: dt.date = Query(...),
     end_date:   dt.date = Query(...),
-    metric:     str     = Query(...),
     user_id:    int     = Query(1),
+    metric:     Optional[str] = Query(None, description="default: all metrics"),
+    fmt:        Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
 ):
+    """
+    Raw rows for [start_date, end_date] streamed as NDJSON or CSV straight
+    off a server-side cursor – no gap-fill, no aggregation, flat memory.
+    """
     if end_date < start_date:
         raise HTTPException(400, "end_date earlier than start_date")
 
-    # pick the right table & timestamp column
-    table, ts_col = choose_table(start_date, end_date)
-
-    sql = f"""
-    SELECT {ts_col} AS ts, value
-    FROM   {table}
-    WHERE  {ts_col} BETWEEN %s AND %s
-      AND  participant = %s
-      AND  metric = %s
-    ORDER  BY {ts_col}
-    """
-
-    params = (
-        start_date,
-        end_date + dt.timedelta(days=1),
-        user_id,
-        metric
+    body = export.stream_raw(start_date, end_date + dt.timedelta(days=1),
+                             user_id, metric, fmt)
+    name = f"participant{user_id}_{metric or 'all'}_{start_date}_{end_date}.{fmt}"
+    return StreamingResponse(
+        body, media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
     )
 
+@app.get("/data/batch", response_model=BatchResponse)
+def get_data_batch(
+    start_date: dt.date   = Query(...),
+    end_date:   dt.date   = Query(...),
+    metric:     List[str] = Query(..., description="repeat for several metrics"),
+    user_id:    List[int] = Query(..., description="repeat for several participants"),
+    max_points: Optional[int] = Query(None, ge=3),
+):
+    """
+    Every (user_id × metric) series over one window in a single query,
+    gap-filled onto one shared grid.  With max_points the grid is reduced
+    by per-bucket means so the series stay aligned point for point.
+    """
+    if end_date < start_date:
+        raise HTTPException(400, "end_date earlier than start_date")
+    metrics, users = sorted(set(metric)), sorted(set(user_id))
+    if len(metrics) * len(users) > MAX_BATCH_SERIES:
+        raise HTTPException(400, f"at most {MAX_BATCH_SERIES} series per request")
+
+    table, ts_col = choose_table(start_date, end_date, max_points)
+    sql, params = series_query(table, ts_col, start_date,
+                               end_date + dt.timedelta(days=1), users, metrics,
+                               keyed=True)
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, params)
         rows = cur.fetchall()
-
     if not rows:
         raise HTTPException(404, "no data")
 
-    if table == "raw_data":
-        interval = dt.timedelta(seconds=1)
-    elif table == "data_1m":
-        interval = dt.timedelta(minutes=1)
-    elif table == "data_1h":
-        interval = dt.timedelta(hours=1)
-    else:  # data_1d
-        interval = dt.timedelta(days=1)
-
-    data_dict = {ts: float(val) for ts, val in rows}
-    known_ts  = sorted(data_dict.keys())
-
-    tz = known_ts[0].tzinfo
+    found = {
+        (pid, m): [(ts, v) for _, _, ts, v in grp]
+        for (pid, m), grp in itertools.groupby(rows, key=lambda r: (r[0], r[1]))
+    }
+    tz = rows[0][2].tzinfo
+    grid = edges = None
+    series = []
+    for pid in users:
+        for m in metrics:
+            got = found.get((pid, m))
+            if not got:
+                series.append((pid, m, None, None))
+                continue
+            grid, values, imputed, _ = _fill(got, table, start_date, end_date)
+            if max_points and len(grid) > max_points:
+                edges = bucket_edges(len(grid), max_points)
+                values = bucket_mean(values, edges)
+                imputed = np.logical_and.reduceat(imputed, edges[:-1])
+            series.append((pid, m, values, imputed))
+
+    n = len(grid) if edges is None else len(edges) - 1
+    if edges is not None:
+        grid = grid[edges[:-1]]
+    return BatchResponse(
+        timestamps=iso_strings(grid, tz),
+        table=table,
+        series=[
+            Series(user_id=pid, metric=m,
+                   values=[None] * n if v is None else v.tolist(),
+                   imputed=[True] * n if imp is None else imp.tolist())
+            for pid, m, v, imp in series
+        ],
+    )
+
+def _fill(rows, table, start_date, end_date, col=1):
+    interval = STEP[table]
+    tz = rows[0][0].tzinfo
     t_start = dt.datetime.combine(start_date, dt.time.min, tzinfo=tz)
     t_end   = dt.datetime.combine(end_date + dt.timedelta(days=1), dt.time.min, tzinfo=tz)
 
-    full_ts, full_vals, imputed_flags = [], [], []
-    t = t_start
-    while t < t_end:
-        full_ts.append(t)
-        if t in data_dict:
-            # exact data point exists
-            full_vals.append(data_dict[t])
-            imputed_flags.append(False)
-        else:
-            # find nearest known points
-            i = bisect.bisect_left(known_ts, t)
-            if i == 0:
-                v = data_dict[known_ts[0]]
-            elif i == len(known_ts):
-                v = data_dict[known_ts[-1]]
-            else:
-                t0, t1 = known_ts[i-1], known_ts[i]
-                v0, v1 = data_dict[t0], data_dict[t1]
-                frac = (t - t0).total_seconds() / (t1 - t0).total_seconds()
-                v = v0 + (v1 - v0) * frac
-            full_vals.append(v)
-            imputed_flags.append(True)
-        t += interval
+    grid, values, imputed = fill_gaps(rows, t_start, t_end, interval, col)
+    return grid, values, imputed, tz
+
+@app.get("/data", response_model=TSResponse, response_model_exclude_none=True)
+def get_data(
+    request:    Request,
+    start_date: dt.date = Query(...),
+    end_date:   dt.date = Query(...),
+    metric:     str     = Query(...),
+    user_id:    int     = Query(1),
+    max_points: Optional[int] = Query(None, ge=3,
+                    description="downsample to at most this many points"),
+    method:     Literal["lttb", "minmax"] = Query("lttb"),
+    fmt:        Optional[Literal["json", "packed"]] = Query(
+                    None, alias="format",
+                    description="default: from the Accept header, else json"),
+    envelope:   bool    = Query(False,
+                    description="also return per-bucket min/max (JSON only)"),
+):
+    if end_date < start_date:
+        raise HTTPException(400, "end_date earlier than start_date")
+
+    # pick the right table & timestamp column
+    table, ts_col = choose_table(start_date, end_date, max_points)
+
+    sql, params = series_query(table, ts_col, start_date,
+                               end_date + dt.timedelta(days=1), (user_id,), (metric,),
+                               envelope=envelope)
+
+    # cached gap-filled series; downsampling is cheap and done per request
+    key = ("data", user_id, metric, start_date, end_date, table, envelope)
+    with get_conn() as conn, conn.cursor() as cur:
+        version = ingest_version(cur, user_id, metric)
+        hit = _cache.get("data", key, version)
+        if hit is None:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+
+    if hit is not None:
+        grid, values, imputed, tz, env = hit
+    else:
+        if not rows:
+            raise HTTPException(404, "no data")
+        grid, values, imputed, tz = _fill(rows, table, start_date, end_date)
+        env = None
+        if envelope:
+            env = tuple(_fill(rows, table, start_date, end_date, col)[1] for col in (2, 3))
+        _cache.put(key, version, (grid, values, imputed, tz, env),
+                   ttl=cache_ttl(table, end_date))
+
+    # thin out to what the chart can actually draw
+    if max_points and len(grid) > max_points:
+        keep = downsample(grid, values, max_points, method)
+        grid, values, imputed = grid[keep], values[keep], imputed[keep]
+        if env is not None:
+            env = tuple(e[keep] for e in env)
+
+    # packed binary if asked for (?format=packed or Accept), JSON otherwise
+    accept = request.headers.get("accept", "")
+    if fmt == "packed" or (fmt is None and packed.PACKED_MEDIA_TYPE in accept):
+        body = packed.encode(grid, values, imputed,
+                             int(utc_offset(tz).total_seconds()))
+        return Response(body, media_type=packed.PACKED_MEDIA_TYPE)
 
     return TSResponse(
-        timestamps=[ts.isoformat() for ts in full_ts],
-        values=full_vals,
-        imputed=imputed_flags
-    )
\ No newline at end of file
+        timestamps=iso_strings(grid, tz),
+        values=values.tolist(),
+        imputed=imputed.tolist(),
+        value_min=None if env is None else env[0].tolist(),
+        value_max=None if env is None else env[1].tolist(),
+    )
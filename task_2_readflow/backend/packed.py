@@ -0,0 +1,65 @@
+"""
+Packed binary encoding of a /data series (media type PACKED_MEDIA_TYPE).
+
+All little-endian, so the browser can read it with DataView / typed arrays
+without copying:
+
+    offset  size  field
+         0     4  magic b"WTS1"
+         4     1  flags   bit 0: regular grid (no timestamp array)
+         5     3  reserved (0)
+         8     4  n       uint32 point count
+        12     4  tz      int32 UTC offset of the series in seconds
+        16     8  start   float64 ms since epoch of the first point
+        24     8  step    float64 ms between points (regular grid only)
+        32    4n  offsets uint32 seconds since start   (irregular only)
+         …    4n  values  float32, NaN for missing
+         …  ⌈n/8⌉ imputed bitmap, bit i%8 of byte i//8
+
+A day of 1 Hz data is ~350 KB instead of ~5 MB of JSON.
+"""
+import struct
+
+import numpy as np
+
+PACKED_MEDIA_TYPE = "application/x-wearables-ts"
+MAGIC  = b"WTS1"
+HEADER = struct.Struct("<4sB3xIidd")       # 32 bytes
+REGULAR = 0x01
+
+
+def encode(grid_us: np.ndarray, values: np.ndarray, imputed: np.ndarray,
+           tz_offset_s: int = 0) -> bytes:
+    n = len(grid_us)
+    start_us = int(grid_us[0]) if n else 0
+    steps = np.diff(grid_us)
+    regular = n < 2 or bool((steps == steps[0]).all())
+    step_ms = float(steps[0]) / 1000 if n >= 2 else 0.0
+
+    parts = [HEADER.pack(MAGIC, REGULAR if regular else 0, n, tz_offset_s,
+                         start_us / 1000, step_ms if regular else 0.0)]
+    if not regular:
+        parts.append(((grid_us - start_us) // 1_000_000).astype("<u4").tobytes())
+    parts.append(values.astype("<f4").tobytes())
+    parts.append(np.packbits(imputed.astype(bool), bitorder="little").tobytes())
+    return b"".join(parts)
+
+
+def decode(buf: bytes):
+    """Inverse of encode – (grid_us, values, imputed, tz_offset_s)."""
+    magic, flags, n, tz, start_ms, step_ms = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("not a packed series")
+    off = HEADER.size
+    start_us = round(start_ms * 1000)
+    if flags & REGULAR:
+        grid = start_us + np.arange(n, dtype=np.int64) * round(step_ms * 1000)
+    else:
+        secs = np.frombuffer(buf, "<u4", n, off)
+        grid = start_us + secs.astype(np.int64) * 1_000_000
+        off += 4 * n
+    values = np.frombuffer(buf, "<f4", n, off).astype(np.float64)
+    off += 4 * n
+    bits = np.frombuffer(buf, np.uint8, (n + 7) // 8, off)
+    imputed = np.unpackbits(bits, count=n, bitorder="little").astype(bool)
+    return grid, values, imputed, tz
@@ -1,53 +1,129 @@
 CREATE EXTENSION IF NOT EXISTS timescaledb;
 
--- 1-minute buckets
+-- written by ingest.py after every load; the read API's response cache
+-- compares updated_at to decide whether a cached answer is still current
+CREATE TABLE IF NOT EXISTS ingest_state (
+  participant  INT         NOT NULL,
+  metric       TEXT        NOT NULL,
+  watermark    TIMESTAMPTZ,
+  updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (participant, metric)
+);
+
+-- Hierarchical rollups: raw_data → data_1m → data_1h → data_1d.
+-- Only data_1m scans raw_data; each coarser view refreshes from the one
+-- below it.  Every level carries min / max / sum / count / last, so averages
+-- stay exact (sum / samples, not an average of averages) and the API can
+-- draw envelopes without touching raw rows.
+--
+-- Views from before the hierarchy (AVG only, each over raw_data) can't be
+-- ALTERed into this shape, so drop them once and rebuild.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM timescaledb_information.continuous_aggregates
+             WHERE view_name = 'data_1m')
+     AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                     WHERE table_name = 'data_1m' AND column_name = 'samples') THEN
+    DROP MATERIALIZED VIEW IF EXISTS adherence_1d;
+    DROP MATERIALIZED VIEW IF EXISTS data_1d;
+    DROP MATERIALIZED VIEW IF EXISTS data_1h;
+    DROP MATERIALIZED VIEW data_1m;
+  END IF;
+END $$;
+
+-- 1-minute buckets (real-time: the base of the hierarchy and of adherence_1d)
 CREATE MATERIALIZED VIEW IF NOT EXISTS data_1m
-WITH (timescaledb.continuous) AS
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
 SELECT
   time_bucket('1 minute', ts)    AS bucket,
   participant,
   metric,
-  AVG(value)                     AS value
+  AVG(value)                     AS value,
+  MIN(value)                     AS value_min,
+  MAX(value)                     AS value_max,
+  SUM(value)                     AS value_sum,
+  COUNT(value)                   AS samples,
+  last(value, ts)                AS value_last,
+  MAX(ts)                        AS last_ts
 FROM raw_data
 GROUP BY bucket, participant, metric;
 
--- 1-hour buckets
+-- 1-hour buckets, from data_1m
 CREATE MATERIALIZED VIEW IF NOT EXISTS data_1h
 WITH (timescaledb.continuous) AS
 SELECT
-  time_bucket('1 hour', ts)      AS bucket,
+  time_bucket('1 hour', bucket)              AS bucket,
   participant,
   metric,
-  AVG(value)                     AS value
-FROM raw_data
-GROUP BY bucket, participant, metric;
+  SUM(value_sum) / NULLIF(SUM(samples), 0)   AS value,
+  MIN(value_min)                             AS value_min,
+  MAX(value_max)                             AS value_max,
+  SUM(value_sum)                             AS value_sum,
+  SUM(samples)                               AS samples,
+  last(value_last, last_ts)                  AS value_last,
+  MAX(last_ts)                               AS last_ts
+FROM data_1m
+GROUP BY time_bucket('1 hour', bucket), participant, metric;
 
--- 1-day buckets
+-- 1-day buckets, from data_1h
 CREATE MATERIALIZED VIEW IF NOT EXISTS data_1d
 WITH (timescaledb.continuous) AS
 SELECT
-  time_bucket('1 day', ts)       AS bucket,
+  time_bucket('1 day', bucket)               AS bucket,
   participant,
   metric,
-  AVG(value)                     AS value
-FROM raw_data
-GROUP BY bucket, participant, metric;
+  SUM(value_sum) / NULLIF(SUM(samples), 0)   AS value,
+  MIN(value_min)                             AS value_min,
+  MAX(value_max)                             AS value_max,
+  SUM(value_sum)                             AS value_sum,
+  SUM(samples)                               AS samples,
+  last(value_last, last_ts)                  AS value_last,
+  MAX(last_ts)                               AS last_ts
+FROM data_1h
+GROUP BY time_bucket('1 day', bucket), participant, metric;
 
--- refresh every hour, keeping last 1 day of raw data
+-- refresh every hour, re-checking the last 7 days for late uploads; only
+-- invalidated ranges are recomputed, so the wide window is cheap and lets
+-- late rows reach data_1h / data_1d through the hierarchy
+-- (offsets mirrored in AGG_POLICY in main.py for raw-tail stitching)
 SELECT add_continuous_aggregate_policy('data_1m',
-  start_offset => INTERVAL '1 day',
+  start_offset => INTERVAL '7 days',
   end_offset   => INTERVAL '1 hour',
-  schedule_interval => INTERVAL '1 hour');
+  schedule_interval => INTERVAL '1 hour',
+  if_not_exists => TRUE);
 
 -- refresh every 6 hours, keeping 7 days
 SELECT add_continuous_aggregate_policy('data_1h',
   start_offset => INTERVAL '7 days',
   end_offset   => INTERVAL '1 day',
-  schedule_interval => INTERVAL '6 hours');
+  schedule_interval => INTERVAL '6 hours',
+  if_not_exists => TRUE);
 
 -- refresh daily, keeping 30 days
 SELECT add_continuous_aggregate_policy('data_1d',
   start_offset => INTERVAL '30 days',
   end_offset   => INTERVAL '7 days',
-  schedule_interval => INTERVAL '1 day');
-  
\ No newline at end of file
+  schedule_interval => INTERVAL '1 day',
+  if_not_exists => TRUE);
+
+-- per-participant daily adherence rollup for /adherence, summed from the
+-- per-minute sample counts instead of counting 1 Hz rows.  Real-time
+-- (materialized_only = false) over a real-time data_1m, so today's uploads
+-- show up before the next refresh
+CREATE MATERIALIZED VIEW IF NOT EXISTS adherence_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+  time_bucket('1 day', bucket)                        AS day,
+  participant,
+  SUM(samples) FILTER (WHERE metric = 'hr')           AS hr_samples,
+  SUM(samples) FILTER (WHERE metric = 'activity')     AS activity_rows,
+  MAX(last_ts)                                        AS last_ts
+FROM data_1m
+GROUP BY time_bucket('1 day', bucket), participant;
+
+-- refresh hourly, re-checking the last 3 days for late uploads
+SELECT add_continuous_aggregate_policy('adherence_1d',
+  start_offset => INTERVAL '3 days',
+  end_offset   => INTERVAL '1 hour',
+  schedule_interval => INTERVAL '1 hour',
+  if_not_exists => TRUE);
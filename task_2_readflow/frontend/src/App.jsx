@@ -1,10 +1,90 @@
-import React, { useState, useEffect } from "react";
-import { LineChart, Line, XAxis, YAxis, Tooltip } from "recharts";
+import React, { useState, useEffect, useRef } from "react";
+import { LineChart, Line, XAxis, YAxis, Tooltip, Brush } from "recharts";
 import dayjs from "dayjs";
 import relativeTime from "dayjs/plugin/relativeTime";
 
 dayjs.extend(relativeTime);
 
+// one point per horizontal pixel of the 900px chart
+const MAX_POINTS = 900;
+
+// zooming: once the brushed window holds fewer than MAX_POINTS/2 overview
+// points, load it from per-day tiles at full chart resolution instead
+const DAY_MS        = 86_400_000;
+const MAX_TILE_DAYS = 3;      // wider windows stay on the overview
+const MAX_TILE_LEVEL = 7;     // day tiles of MAX_POINTS << level points
+const TILE_CACHE    = 60;     // tiles kept client-side (user × metric × day × level)
+const BRUSH_DEBOUNCE_MS = 250;
+
+/* decode /data?format=packed (layout documented in backend/packed.py) */
+function decodePacked(buf) {
+  const dv = new DataView(buf);
+  const magic = String.fromCharCode(...new Uint8Array(buf, 0, 4));
+  if (magic !== "WTS1") throw new Error("not a packed series");
+  const regular = dv.getUint8(4) & 1;
+  const n       = dv.getUint32(8, true);
+  const start   = dv.getFloat64(16, true);     // ms since epoch
+  const step    = dv.getFloat64(24, true);
+
+  let off = 32;
+  const times = new Float64Array(n);
+  if (regular) {
+    for (let i = 0; i < n; i++) times[i] = start + i * step;
+  } else {
+    const secs = new Uint32Array(buf, off, n);
+    for (let i = 0; i < n; i++) times[i] = start + secs[i] * 1000;
+    off += 4 * n;
+  }
+  const values = new Float32Array(buf, off, n);
+  off += 4 * n;
+  const bits = new Uint8Array(buf, off, (n + 7) >> 3);
+  const imputed = i => (bits[i >> 3] >> (i & 7)) & 1;
+  return { n, times, values, imputed };
+}
+
+/* decoded series -> chart rows; one pass, flags trailing imputed points */
+function toRows({ n, times, values, imputed }) {
+  // the line's last real (non-imputed) point; imputed points after it are
+  // forward-filled and shown as dots
+  let lastTruePos = n - 1;
+  while (lastTruePos >= 0 && imputed(lastTruePos) === 1) lastTruePos--;
+
+  const rows = new Array(n);
+  for (let i = 0; i < n; i++) {
+    const imp = imputed(i) === 1;
+    rows[i] = {
+      tsMs : times[i],                              // epoch ms for logic
+      ts   : dayjs(times[i]).format("MM-DD HH:mm"), // display label
+      val  : Number.isNaN(values[i]) ? null : values[i],
+      imp,
+      showImp : imp && i > lastTruePos,
+    };
+  }
+  return rows;
+}
+
+async function fetchSeries({ start, end, metric, userId, maxPoints = MAX_POINTS }) {
+  const url = new URL("http://localhost:8000/data");
+  url.searchParams.append("start_date", start);
+  url.searchParams.append("end_date",   end);
+  url.searchParams.append("metric",     metric);
+  url.searchParams.append("user_id",    userId);
+  url.searchParams.append("max_points", maxPoints);    // server-side LTTB
+  url.searchParams.append("format",     "packed");     // binary, see decodePacked
+
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`API error loading data (${res.status})`);
+  return toRows(decodePacked(await res.arrayBuffer()));
+}
+
+/* UTC days ("YYYY-MM-DD") touched by [t0, t1] – /data windows are whole days */
+function daysBetween(t0, t1) {
+  const days = [];
+  for (let t = Math.floor(t0 / DAY_MS) * DAY_MS; t <= t1; t += DAY_MS)
+    days.push(new Date(t).toISOString().slice(0, 10));
+  return days;
+}
+
 export default function App() {
   /* state */
   const [metric, setMetric]         = useState("hr");
@@ -12,8 +92,8 @@ export default function App() {
   const [start, setStart]           = useState("2024-01-01");
   const [end,   setEnd]             = useState("2024-01-07");
 
-  const [data,        setData]        = useState([]);      // full line
-  const [imputedData, setImputedData] = useState([]);      // red dots
+  const [overview,    setOverview]    = useState([]);      // whole range, coarse
+  const [data,        setData]        = useState([]);      // zoom window
   const [adherence,   setAdherence]   = useState(null);    // adherence cards
   const [plist,       setPlist]       = useState([]);      // sidebar list
 
@@ -25,40 +105,72 @@ export default function App() {
       .catch(console.error);
   }, []);
 
-  /* helpers */
- const fetchData = async () => {
-  const url = new URL("http://localhost:8000/data");
-  url.searchParams.append("start_date", start);
-  url.searchParams.append("end_date",   end);
-  url.searchParams.append("metric",     metric);
-  url.searchParams.append("user_id",    userId);
+  const tiles     = useRef(new Map());   // "user|metric|day|level" -> Promise<rows>
+  const viewReq   = useRef(0);           // drops responses for stale windows
+  const brushWait = useRef(null);
 
-  const res = await fetch(url);
-  if (!res.ok) { alert("API error loading data"); return; }
+  /* helpers */
+  const fetchData = async () => {
+    const req = ++viewReq.current;
+    let rows;
+    try {
+      rows = await fetchSeries({ start, end, metric, userId });
+    } catch (e) {
+      alert(e.message);
+      return;
+    }
+    if (req !== viewReq.current) return;
+    setOverview(rows);
+    setData(rows);
+  };
 
-  const json = await res.json();
+  const tile = (day, level) => {
+    const key = `${userId}|${metric}|${day}|${level}`;
+    let p = tiles.current.get(key);
+    if (p) {
+      tiles.current.delete(key);            // re-insert: most recently used
+    } else {
+      p = fetchSeries({ start: day, end: day, metric, userId,
+                        maxPoints: MAX_POINTS << level });
+      p.catch(() => tiles.current.delete(key));   // retry on the next zoom
+    }
+    tiles.current.set(key, p);
+    if (tiles.current.size > TILE_CACHE)
+      tiles.current.delete(tiles.current.keys().next().value);
+    return p;
+  };
 
-  const rows = json.timestamps.map((ts, i) => ({
-    tsISO : ts,                               // keep raw iso for logic
-    ts    : dayjs(ts).format("MM-DD HH:mm"),  // display label
-    val   : json.values[i],
-    imp   : json.imputed[i],
-  }));
+  /* brushed window of the overview -> chart data */
+  const showWindow = async (startIndex, endIndex) => {
+    const req = ++viewReq.current;
+    const span = overview.slice(startIndex, endIndex + 1);
+    if (span.length === 0) return;
+    const t0 = span[0].tsMs, t1 = span[span.length - 1].tsMs;
+    const days = daysBetween(t0, t1);
 
-  const lastTrueIdx =
-      [...rows].reverse().findIndex(r => !r.imp);
-  const lastTruePos = lastTrueIdx === -1
-      ? -1
-      : rows.length - 1 - lastTrueIdx;
+    setData(span);                          // coarse until the tiles land
+    if (span.length >= MAX_POINTS / 2 || days.length > MAX_TILE_DAYS) return;
 
-  const rowsWithDisplayFlag = rows.map((r, i) => ({
-    ...r,
-    showImp : r.imp && i > lastTruePos
-  }));
+    // finer tiles for narrower windows, so ~MAX_POINTS stay on screen;
+    // power-of-two levels keep the number of distinct tiles small
+    const level = Math.min(MAX_TILE_LEVEL,
+      Math.max(0, Math.ceil(Math.log2(DAY_MS / Math.max(t1 - t0, 1)))));
+    let parts;
+    try {
+      parts = await Promise.all(days.map(d => tile(d, level)));
+    } catch (e) {
+      console.error(e);
+      return;
+    }
+    if (req !== viewReq.current) return;
+    setData(parts.flat().filter(r => r.tsMs >= t0 && r.tsMs <= t1));
+  };
 
-  setData(rowsWithDisplayFlag);
-  setImputedData(rowsWithDisplayFlag.filter(r => r.showImp));
-};
+  const onBrush = ({ startIndex, endIndex }) => {
+    clearTimeout(brushWait.current);
+    brushWait.current = setTimeout(
+      () => showWindow(startIndex, endIndex), BRUSH_DEBOUNCE_MS);
+  };
 
   const fetchAdherence = async () => {
     const url = new URL("http://localhost:8000/adherence");
@@ -185,6 +297,14 @@ export default function App() {
               }
             />
           </LineChart>
+
+          {/* overview: drag the handles to zoom, finer tiles load on demand */}
+          <LineChart width={900} height={90} data={overview}
+                     key={`${userId}|${metric}|${start}|${end}`}>
+            <Line type="monotone" dataKey="val" stroke="#9bb5e0" dot={false}
+                  isAnimationActive={false} />
+            <Brush dataKey="ts" height={24} stroke="#4287f5" onChange={onBrush} />
+          </LineChart>
         </div>
       </div>
     </div>